@@ -1,3 +1,4 @@
+import secrets
 from decouple import config
 
 DB_USER = config('DB_USER', '')
@@ -5,9 +6,126 @@ DB_PASSWORD = config('DB_PASSWORD', '')
 DB_HOST = config('DB_HOST', '')
 DB_PORT = config('DB_PORT', default=5432, cast=int)
 DB_NAME = config('DB_NAME', '')
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=10, cast=int)
+DB_MAX_OVERFLOW = config('DB_MAX_OVERFLOW', default=20, cast=int)
+DB_ECHO = config('DB_ECHO', default=False, cast=bool)
+SQL_LOG_SAMPLE_RATE = config('SQL_LOG_SAMPLE_RATE', default=0.0, cast=float)
 
 OPENAI_API_KEY = config('OPENAI_API_KEY', '')
+# Point at a local fake server (python -m benchmarks.fake_openai) for tests and benchmarks
+OPENAI_BASE_URL = config('OPENAI_BASE_URL', default='')
+
+# LLM gateway: concurrent upstream calls, concurrent chat streams, embedding coalescing window,
+# request/token budgets per minute (0 = unlimited) and retry policy for rate limits and upstream errors
+LLM_MAX_CONCURRENCY = config('LLM_MAX_CONCURRENCY', default=16, cast=int)
+LLM_MAX_STREAMS = config('LLM_MAX_STREAMS', default=64, cast=int)
+LLM_BATCH_WINDOW_MS = config('LLM_BATCH_WINDOW_MS', default=5.0, cast=float)
+LLM_REQUESTS_PER_MINUTE = config('LLM_REQUESTS_PER_MINUTE', default=3000, cast=int)
+LLM_TOKENS_PER_MINUTE = config('LLM_TOKENS_PER_MINUTE', default=1000000, cast=int)
+LLM_MAX_ATTEMPTS = config('LLM_MAX_ATTEMPTS', default=5, cast=int)
+LLM_BASE_BACKOFF = config('LLM_BASE_BACKOFF', default=0.5, cast=float)
+LLM_MAX_BACKOFF = config('LLM_MAX_BACKOFF', default=20.0, cast=float)
+LLM_TIMEOUT = config('LLM_TIMEOUT', default=60.0, cast=float)
 
 # DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 DATABASE_URL = config('DATABASE_URL', '')
-DATABASE_PUBLIC_URL = config('DATABASE_PUBLIC_URL', '')
\ No newline at end of file
+DATABASE_PUBLIC_URL = config('DATABASE_PUBLIC_URL', '')
+
+SUMMARY_CONCURRENCY = config('SUMMARY_CONCURRENCY', default=8, cast=int)
+EMBEDDING_BATCH_SIZE = config('EMBEDDING_BATCH_SIZE', default=100, cast=int)
+INSERT_BATCH_SIZE = config('INSERT_BATCH_SIZE', default=500, cast=int)
+# Most ISBNs accepted by one /addBooksFromISBNs request; each one costs a lookup, a summary and an embedding
+ADD_BOOKS_MAX_BATCH = config('ADD_BOOKS_MAX_BATCH', default=200, cast=int)
+
+ENRICHMENT_CONCURRENCY = config('ENRICHMENT_CONCURRENCY', default=4, cast=int)
+ENRICHMENT_BATCH_SIZE = config('ENRICHMENT_BATCH_SIZE', default=16, cast=int)
+ENRICHMENT_MAX_ATTEMPTS = config('ENRICHMENT_MAX_ATTEMPTS', default=6, cast=int)
+ENRICHMENT_BASE_BACKOFF = config('ENRICHMENT_BASE_BACKOFF', default=5.0, cast=float)
+ENRICHMENT_MAX_BACKOFF = config('ENRICHMENT_MAX_BACKOFF', default=900.0, cast=float)
+ENRICHMENT_POLL_SECONDS = config('ENRICHMENT_POLL_SECONDS', default=10.0, cast=float)
+ENRICHMENT_LEASE_SECONDS = config('ENRICHMENT_LEASE_SECONDS', default=300, cast=int)
+
+BOOKS_PAGE_SIZE = config('BOOKS_PAGE_SIZE', default=100, cast=int)
+BOOKS_MAX_PAGE_SIZE = config('BOOKS_MAX_PAGE_SIZE', default=1000, cast=int)
+STREAM_CHUNK_SIZE = config('STREAM_CHUNK_SIZE', default=500, cast=int)
+
+# Tokens are signed per deployment; set SESSION_SECRET so they survive restarts (run.py generates one
+# for all workers when WORKERS > 1 and it is unset)
+SESSION_SECRET = config('SESSION_SECRET', default=secrets.token_urlsafe(32))
+SESSION_TTL_SECONDS = config('SESSION_TTL_SECONDS', default=7 * 24 * 3600, cast=int)
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)
+
+WISHLIST_PAGE_SIZE = config('WISHLIST_PAGE_SIZE', default=50, cast=int)
+WISHLIST_MAX_PAGE_SIZE = config('WISHLIST_MAX_PAGE_SIZE', default=500, cast=int)
+# Most ISBNs accepted by one batch add or remove
+WISHLIST_MAX_BATCH = config('WISHLIST_MAX_BATCH', default=1000, cast=int)
+
+REVIEWS_PAGE_SIZE = config('REVIEWS_PAGE_SIZE', default=20, cast=int)
+REVIEWS_MAX_PAGE_SIZE = config('REVIEWS_MAX_PAGE_SIZE', default=100, cast=int)
+
+LIKE_FLUSH_SECONDS = config('LIKE_FLUSH_SECONDS', default=2.0, cast=float)
+# Buffered likes whose batch keeps failing are dropped after LIKE_FLUSH_MAX_ATTEMPTS flushes
+LIKE_FLUSH_MAX_ATTEMPTS = config('LIKE_FLUSH_MAX_ATTEMPTS', default=5, cast=int)
+
+# Bulk review import commits every REVIEW_IMPORT_CHUNK_SIZE rows and reports at most REVIEW_IMPORT_MAX_ERRORS
+# failed rows; exports are streamed in REVIEW_EXPORT_CHUNK_BYTES pieces with at most REVIEW_EXPORT_QUEUE_SIZE buffered
+REVIEW_IMPORT_CHUNK_SIZE = config('REVIEW_IMPORT_CHUNK_SIZE', default=5000, cast=int)
+REVIEW_IMPORT_MAX_ERRORS = config('REVIEW_IMPORT_MAX_ERRORS', default=1000, cast=int)
+REVIEW_EXPORT_CHUNK_BYTES = config('REVIEW_EXPORT_CHUNK_BYTES', default=256 * 1024, cast=int)
+REVIEW_EXPORT_QUEUE_SIZE = config('REVIEW_EXPORT_QUEUE_SIZE', default=16, cast=int)
+
+CONTEST_SAMPLER_MAX_AGE = config('CONTEST_SAMPLER_MAX_AGE', default=300.0, cast=float)
+
+# Review leaderboards; books need LEADERBOARD_MIN_RATINGS ratings to appear on the top-rated board
+LEADERBOARD_SIZE = config('LEADERBOARD_SIZE', default=10, cast=int)
+LEADERBOARD_MAX_SIZE = config('LEADERBOARD_MAX_SIZE', default=100, cast=int)
+LEADERBOARD_MIN_RATINGS = config('LEADERBOARD_MIN_RATINGS', default=5, cast=int)
+
+RESPONSE_CACHE_BACKEND = config('RESPONSE_CACHE_BACKEND', default='memory')
+RESPONSE_CACHE_MAX_ENTRIES = config('RESPONSE_CACHE_MAX_ENTRIES', default=10000, cast=int)
+RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', default=60.0, cast=float)
+
+OPENLIBRARY_BASE_URL = config('OPENLIBRARY_BASE_URL', default='https://openlibrary.org')
+OPENLIBRARY_MODE = config('OPENLIBRARY_MODE', default='live')
+OPENLIBRARY_BATCH_SIZE = config('OPENLIBRARY_BATCH_SIZE', default=50, cast=int)
+OPENLIBRARY_MAX_CONNECTIONS = config('OPENLIBRARY_MAX_CONNECTIONS', default=10, cast=int)
+OPENLIBRARY_TIMEOUT = config('OPENLIBRARY_TIMEOUT', default=10.0, cast=float)
+OPENLIBRARY_CACHE_PATH = config('OPENLIBRARY_CACHE_PATH', default='openlibrary_cache.sqlite3')
+OPENLIBRARY_REPLAY_PATH = config('OPENLIBRARY_REPLAY_PATH', default='openlibrary_replay.sqlite3')
+OPENLIBRARY_CACHE_TTL = config('OPENLIBRARY_CACHE_TTL', default=30 * 24 * 3600, cast=float)
+OPENLIBRARY_NEGATIVE_TTL = config('OPENLIBRARY_NEGATIVE_TTL', default=24 * 3600, cast=float)
+
+LLM_CACHE_PATH = config('LLM_CACHE_PATH', default='llm_cache.sqlite3')
+LLM_CACHE_MAX_ENTRIES = config('LLM_CACHE_MAX_ENTRIES', default=100000, cast=int)
+# /chat query embeddings stay out of the persistent LLM cache, in a per-process LRU of this many entries
+QUERY_EMBEDDING_CACHE_SIZE = config('QUERY_EMBEDDING_CACHE_SIZE', default=1024, cast=int)
+
+# text-embedding-3-large returns 3072 dimensions; smaller values are requested from the API and stored truncated
+EMBEDDING_DIMENSIONS = config('EMBEDDING_DIMENSIONS', default=3072, cast=int)
+EMBEDDING_STORAGE = config('EMBEDDING_STORAGE', default='float')
+INDEX_BLOCK_ROWS = config('INDEX_BLOCK_ROWS', default=1024, cast=int)
+
+# Set to share one memory-mapped embedding snapshot between worker processes (run.py sets it when WORKERS > 1)
+EMBEDDING_SNAPSHOT_DIR = config('EMBEDDING_SNAPSHOT_DIR', default='')
+EMBEDDING_SNAPSHOT_POLL_SECONDS = config('EMBEDDING_SNAPSHOT_POLL_SECONDS', default=1.0, cast=float)
+EMBEDDING_SNAPSHOTS_KEPT = config('EMBEDDING_SNAPSHOTS_KEPT', default=2, cast=int)
+
+# /chat retrieval: default and maximum books per answer, weight of the lexical score in the fused
+# ranking, and the lexical score above which only lexical hits are vector-scored
+CHAT_TOP_K = config('CHAT_TOP_K', default=3, cast=int)
+CHAT_MAX_TOP_K = config('CHAT_MAX_TOP_K', default=20, cast=int)
+SEARCH_LEXICAL_WEIGHT = config('SEARCH_LEXICAL_WEIGHT', default=0.3, cast=float)
+SEARCH_PRECISE_SCORE = config('SEARCH_PRECISE_SCORE', default=0.75, cast=float)
+
+# Semantic /chat answer cache: capacity (0 disables), minimum query cosine similarity, and lifetime in seconds
+ANSWER_CACHE_MAX_ENTRIES = config('ANSWER_CACHE_MAX_ENTRIES', default=1000, cast=int)
+ANSWER_CACHE_THRESHOLD = config('ANSWER_CACHE_THRESHOLD', default=0.95, cast=float)
+ANSWER_CACHE_TTL = config('ANSWER_CACHE_TTL', default=3600.0, cast=float)
+
+# Precomputed "similar books": neighbors kept per book, candidates checked when a book is added,
+# and row/column block sizes for the full rebuild's matrix multiplication
+NEIGHBORS_K = config('NEIGHBORS_K', default=10, cast=int)
+NEIGHBORS_CANDIDATES = config('NEIGHBORS_CANDIDATES', default=200, cast=int)
+NEIGHBORS_BLOCK_ROWS = config('NEIGHBORS_BLOCK_ROWS', default=1024, cast=int)
+NEIGHBORS_BLOCK_COLS = config('NEIGHBORS_BLOCK_COLS', default=16384, cast=int)
+RECOMMENDATIONS_MIN_RATING = config('RECOMMENDATIONS_MIN_RATING', default=4, cast=int)
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic import BaseModel
 
 class AccountCreate(BaseModel):
@@ -8,6 +9,18 @@ class AccountCreate(BaseModel):
 class ISBNRequest(BaseModel):
     isbn: str
 
+class ISBNListRequest(BaseModel):
+    isbns: list[str]
+
 class WishlistRequest(BaseModel):
     account_id: int
-    isbn: str
\ No newline at end of file
+    isbn: str
+class WishlistBatchRequest(BaseModel):
+    account_id: int
+    isbns: list[str]
+
+class LikeRequest(BaseModel):
+    review_id: int
+    account_id: int
+    isbn: str
+    action: Literal["like", "unlike"]
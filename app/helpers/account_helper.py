@@ -1,14 +1,101 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import Depends, Header, HTTPException
 from passlib.context import CryptContext
 from sqlalchemy import text
+from app.common.constants import SESSION_SECRET, SESSION_TTL_SECONDS, PASSWORD_HASH_WORKERS
+from app.helpers.db_helper import engine
+
+# Built once per process, including each worker of the hashing pool
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+
+_hash_executor = None
 
 def get_password_hash(password: str) -> str:
-    pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
     return pwd_context.hash(password)
 
-def verify_login(username: str, password: str, db) -> bool:
-    pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-    hashed_password = db.execute(
-        text("SELECT password_hash FROM accounts WHERE username = :username"),
-        {"username": username}
-    )
-    return pwd_context.verify(password, hashed_password.scalar()) if hashed_password else False
\ No newline at end of file
+def _verify_password(password: str, password_hash: str) -> bool:
+    return pwd_context.verify(password, password_hash)
+
+# Argon2 is deliberately CPU and memory heavy, so it runs in a small process pool
+# instead of competing with request handling for the event loop and the GIL.
+# Workers come from a fork server rather than a fork of the app, which by then has threads
+# (forking those can deadlock) and an embedding index every child would inherit.
+def start_hash_executor() -> ProcessPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _hash_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                             mp_context=multiprocessing.get_context(method))
+    return _hash_executor
+
+def _get_hash_executor() -> ProcessPoolExecutor:
+    return start_hash_executor()
+
+def shutdown_hash_executor():
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(cancel_futures=True)
+        _hash_executor = None
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), get_password_hash, password)
+
+async def verify_login(password: str, password_hash: str | None) -> bool:
+    if not password_hash:
+        return False
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), _verify_password, password, password_hash)
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+# Session tokens are "<base64 claims>.<HMAC-SHA256 signature>", checked without a DB or password round trip
+def create_session_token(account_id: int, username: str, is_admin: bool) -> str:
+    claims = {"account_id": account_id, "username": username, "is_admin": is_admin,
+              "exp": int(time.time()) + SESSION_TTL_SECONDS}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+def read_session_token(token: str) -> dict | None:
+    payload, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    return claims if claims.get("exp", 0) > time.time() else None
+
+def get_current_account(authorization: str | None = Header(None, alias="Authorization")) -> dict:
+    token = authorization.removeprefix("Bearer ").strip() if authorization else ""
+    claims = read_session_token(token) if token else None
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    return claims
+
+# Bulk data endpoints are limited to admins. The is_admin claim outlives revocation, so it is re-checked
+# on its own short-lived connection (imports and exports hold the request open for a long time)
+async def get_admin_account(session: dict = Depends(get_current_account)) -> dict:
+    if session.get("is_admin"):
+        async with engine.connect() as conn:
+            session["is_admin"] = (await conn.execute(
+                text("SELECT is_admin FROM accounts WHERE account_id = :account_id"),
+                {"account_id": session["account_id"]}
+            )).scalar() is True
+    if not session.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return session
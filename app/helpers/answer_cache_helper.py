@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.common.constants import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL
+from app.helpers.metrics_helper import Counter, Gauge
+
+# Semantic cache of streamed /chat answers. An entry is found by its signature (prompt template plus
+# the set of retrieved books, each with the index's updated_at stamp) and then by cosine similarity of
+# the query embedding, so near-identical questions over the same books share one completion.
+# Re-enriching or removing a cited book changes or drops its stamp, so stale answers never match;
+# this also holds across workers, since the stamps travel in the shared embedding snapshot.
+
+ANSWER_CACHE_REQUESTS = Counter("chat_answer_cache_requests_total", "Semantic answer cache lookups", ("result",))
+ANSWER_CACHE_SAVED_SECONDS = Counter(
+    "chat_answer_cache_saved_seconds_total", "Completion time avoided by serving cached answers"
+)
+
+def answer_signature(template_hash: str, books: list[dict]) -> tuple:
+    return (template_hash, frozenset((book["isbn"], book.get("updated_at")) for book in books))
+
+class CachedAnswer:
+    __slots__ = ("signature", "embedding", "chunks", "seconds", "expires_at")
+
+    def __init__(self, signature, embedding, chunks, seconds, expires_at):
+        self.signature = signature
+        self.embedding = embedding
+        self.chunks = chunks
+        self.seconds = seconds
+        self.expires_at = expires_at
+
+class AnswerCache:
+    def __init__(self, max_entries: int, threshold: float, ttl: float):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._signatures = {}
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    # Returns the closest cached answer with this signature above the similarity threshold
+    def get(self, signature: tuple, embedding):
+        if self.max_entries <= 0:
+            return None
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        best, best_id, best_similarity = None, None, self.threshold
+        with self._lock:
+            for entry_id in list(self._signatures.get(signature, ())):
+                entry = self._entries[entry_id]
+                if entry.expires_at < now:
+                    self._discard(entry_id)
+                    continue
+                if entry.embedding.shape != query.shape:
+                    continue
+                similarity = float(entry.embedding @ query)
+                if similarity >= best_similarity:
+                    best, best_id, best_similarity = entry, entry_id, similarity
+            if best_id is not None:
+                self._entries.move_to_end(best_id)
+        ANSWER_CACHE_REQUESTS.inc(result="hit" if best is not None else "miss")
+        if best is not None:
+            ANSWER_CACHE_SAVED_SECONDS.inc(best.seconds)
+        return best
+
+    def put(self, signature: tuple, embedding, chunks: list[str], seconds: float):
+        if self.max_entries <= 0:
+            return
+        entry = CachedAnswer(signature, self._normalize(embedding), tuple(chunks), seconds, time.monotonic() + self.ttl)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._signatures.setdefault(signature, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._signatures.clear()
+
+    def _discard(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        ids = self._signatures.get(entry.signature)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._signatures[entry.signature]
+
+answer_cache = AnswerCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL)
+
+Gauge("chat_answer_cache_entries", "Answers held in the semantic answer cache", callback=lambda: len(answer_cache))
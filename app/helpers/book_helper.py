@@ -0,0 +1,55 @@
+from datetime import datetime
+from fastapi import HTTPException
+
+BOOK_COLUMNS = ["isbn", "title", "authors", "publishers", "publication_date", "genres", "pages", "image"]
+
+# Maps an OpenLibrary jscmd=data record onto the columns of the books table
+def parse_book_data(isbn: str, book_data: dict) -> dict:
+    pages = book_data.get("number_of_pages")
+    return {
+        "isbn": isbn,
+        "title": book_data.get("title"),
+        "authors": [a.get("name") for a in book_data.get("authors", [])],
+        "publishers": [p.get("name") for p in book_data.get("publishers", [])],
+        "publication_date": book_data.get("publish_date"),
+        "genres": [s.get("name") for s in book_data.get("subjects", [])],
+        "pages": int(pages) if pages else None,
+        "image": book_data.get("cover", {}).get("medium")
+    }
+
+# Review aggregates that listings join from book_review_stats (aliased s, with books aliased b)
+BOOK_STATS_COLUMNS = {
+    "review_count": "COALESCE(s.review_count, 0)",
+    "average_rating": "s.average_rating",
+    "like_count": "COALESCE(s.like_count, 0)",
+}
+LISTING_COLUMNS = BOOK_COLUMNS + list(BOOK_STATS_COLUMNS)
+
+# Turns a comma separated fields header into a validated column list; isbn is always kept for the cursor
+def parse_fields(fields: str | None) -> list[str]:
+    if not fields:
+        return LISTING_COLUMNS
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in LISTING_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["isbn"] + [field for field in dict.fromkeys(requested) if field != "isbn"]
+
+# SELECT list and FROM clause for listing columns; book_review_stats is only joined when a stat is requested
+def listing_query(columns: list[str]) -> tuple[str, str]:
+    select = ", ".join(f"{BOOK_STATS_COLUMNS[column]} AS {column}" if column in BOOK_STATS_COLUMNS else f"b.{column}"
+                       for column in columns)
+    if any(column in BOOK_STATS_COLUMNS for column in columns):
+        return select, "books b LEFT JOIN book_review_stats s ON s.isbn = b.isbn"
+    return select, "books b"
+
+# Keyset cursor for paging a wishlist newest first: "<added_at>|<isbn>"
+def encode_wishlist_cursor(item: dict) -> str:
+    return f"{item['added_at'].isoformat()}|{item['isbn']}"
+
+def decode_wishlist_cursor(cursor: str) -> tuple:
+    try:
+        added_at, isbn = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(added_at), isbn
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
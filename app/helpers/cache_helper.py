@@ -0,0 +1,136 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from app.common.constants import RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL
+from app.helpers.metrics_helper import Counter
+
+# Read-through cache for JSON responses. Entries carry tags ("book:<isbn>", "reviews:<isbn>", ...)
+# and write routes invalidate exactly the tags they touch. Each tag has a generation number, so
+# a response loaded while a write to one of its tags was happening is never stored. Generations come
+# from one counter; tags without cached entries are forgotten and then read as the counter's value at
+# that point, so no tag's generation ever goes back and the table stays bounded.
+
+CACHE_REQUESTS = Counter("response_cache_requests_total", "Response cache lookups", ("namespace", "result"))
+
+class LRUCacheBackend:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._generations = {}
+        self._clock = 0
+        self._floor = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def generations(self, tags) -> tuple:
+        with self._lock:
+            return tuple(self._generations.get(tag, self._floor) for tag in tags)
+
+    def set(self, key, value, tags, generations: tuple):
+        with self._lock:
+            if tuple(self._generations.get(tag, self._floor) for tag in tags) != generations:
+                return
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._clock += 1
+                self._generations[tag] = self._clock
+                for key in self._tags.pop(tag, ()):
+                    self._discard(key)
+            if len(self._generations) > 2 * self.max_entries:
+                self._generations = {tag: generation for tag, generation in self._generations.items()
+                                     if tag in self._tags}
+                self._floor = self._clock
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+# Keeps ETags working when caching is turned off
+class NullCacheBackend:
+    def get(self, key):
+        return None
+
+    def generations(self, tags) -> tuple:
+        return ()
+
+    def set(self, key, value, tags, generations: tuple):
+        pass
+
+    def invalidate(self, *tags):
+        pass
+
+    def clear(self):
+        pass
+
+CACHE_BACKENDS = {
+    "memory": lambda: LRUCacheBackend(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL),
+    "none": NullCacheBackend,
+}
+
+response_cache = CACHE_BACKENDS[RESPONSE_CACHE_BACKEND]()
+
+class CachedResponse:
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+# Serves a JSON response from the cache, calling loader() only on a miss. A request whose
+# If-None-Match still matches gets a 304 with no body; on a hit that means no database work at all.
+async def cached_json_response(request: Request, key: tuple, tags: list[str], loader) -> Response:
+    entry = response_cache.get(key)
+    CACHE_REQUESTS.inc(namespace=key[0], result="hit" if entry is not None else "miss")
+    if entry is None:
+        generations = response_cache.generations(tags)
+        value = await loader()
+        entry = CachedResponse(json.dumps(jsonable_encoder(value)).encode())
+        response_cache.set(key, entry, tags, generations)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -1,5 +1,9 @@
 import bisect
 import random
+import time
+import numpy as np
+from sqlalchemy import text
+from app.common.constants import CONTEST_SAMPLER_MAX_AGE
 
 # Selects a random winner from the list of accounts, weighted by the number of reviews they submitted
 
@@ -14,4 +18,113 @@ def choose_winner(accounts_and_counts):
 
     index = bisect.bisect_left(prefix, r)
     return accounts_and_counts[index][0] if index < len(accounts_and_counts) else None
-    
\ No newline at end of file
+    
+# Fenwick tree over per-account review counts. Reviews update it in O(log n) as they are
+# written or deleted, and a weighted draw walks the tree in O(log n) instead of rebuilding
+# the prefix sums for every contest.
+
+class ReviewCountSampler:
+    def __init__(self, capacity: int = 1024):
+        self._tree = np.zeros(capacity + 1, dtype=np.int64)
+        self._counts = np.zeros(capacity, dtype=np.int64)
+        self._slots = {}
+        self._accounts = []
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self._accounts)
+
+    @property
+    def total(self) -> int:
+        return self._prefix(len(self._accounts))
+
+    def count(self, account_id) -> int:
+        slot = self._slots.get(account_id)
+        return int(self._counts[slot]) if slot is not None else 0
+
+    # Builds the tree in O(n) from prefix sums: node i covers the (i - lowbit(i), i] range
+    def _rebuild(self, capacity: int):
+        size = len(self._accounts)
+        counts = np.zeros(capacity, dtype=np.int64)
+        counts[:size] = self._counts[:size]
+        prefix = np.concatenate(([0], np.cumsum(counts)))
+        index = np.arange(1, capacity + 1)
+        tree = np.zeros(capacity + 1, dtype=np.int64)
+        tree[1:] = prefix[index] - prefix[index - (index & -index)]
+        self._counts, self._tree = counts, tree
+
+    def load(self, accounts_and_counts):
+        accounts_and_counts = [(account, count) for account, count in accounts_and_counts if count > 0]
+        self._accounts = [account for account, _ in accounts_and_counts]
+        self._slots = {account: slot for slot, account in enumerate(self._accounts)}
+        self._counts = np.array([count for _, count in accounts_and_counts], dtype=np.int64)
+        self._rebuild(max(1024, len(self._accounts)))
+        self.loaded_at = time.monotonic()
+
+    def _prefix(self, index: int) -> int:
+        total = 0
+        while index > 0:
+            total += int(self._tree[index])
+            index -= index & -index
+        return total
+
+    def update(self, account_id, delta: int):
+        slot = self._slots.get(account_id)
+        if slot is None:
+            if delta <= 0:
+                return
+            slot = len(self._accounts)
+            if slot >= len(self._counts):
+                self._rebuild(len(self._counts) * 2)
+            self._slots[account_id] = slot
+            self._accounts.append(account_id)
+        delta = max(delta, -int(self._counts[slot]))
+        self._counts[slot] += delta
+        index = slot + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    # Finds the account whose cumulative range contains a uniform draw from 1..total
+    def sample(self, rng: np.random.Generator | None = None):
+        total = self.total
+        if total <= 0:
+            return None
+        rng = rng or np.random.default_rng()
+        remaining = int(rng.integers(1, total + 1))
+        index = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            candidate = index + step
+            if candidate < len(self._tree) and self._tree[candidate] < remaining:
+                index = candidate
+                remaining -= int(self._tree[candidate])
+            step >>= 1
+        return self._accounts[index]
+
+    # Draws k distinct accounts, weighted by review count, in one vectorized pass
+    # (Efraimidis-Spirakis: keep the k largest u ** (1 / weight), computed in log space)
+    def sample_many(self, k: int, rng: np.random.Generator | None = None) -> list:
+        rng = rng or np.random.default_rng()
+        weights = self._counts[:len(self._accounts)].astype(np.float64)
+        eligible = np.flatnonzero(weights > 0)
+        k = min(k, len(eligible))
+        if k <= 0:
+            return []
+        keys = np.log(rng.random(len(eligible))) / weights[eligible]
+        top = np.argpartition(-keys, k - 1)[:k]
+        top = top[np.argsort(-keys[top])]
+        return [self._accounts[i] for i in eligible[top]]
+
+review_sampler = ReviewCountSampler()
+
+# Loads per-account review counts on first use. Other workers' writes are not seen by this
+# process, so the counts are also reloaded once they are older than CONTEST_SAMPLER_MAX_AGE.
+async def ensure_sampler_loaded(db):
+    loaded_at = review_sampler.loaded_at
+    if loaded_at is not None and time.monotonic() - loaded_at < CONTEST_SAMPLER_MAX_AGE:
+        return
+    rows = (await db.execute(
+        text('''SELECT account_id, review_count FROM account_review_stats WHERE review_count > 0''')
+    )).fetchall()
+    review_sampler.load((row.account_id, row.review_count) for row in rows)
@@ -1,8 +1,30 @@
-from sqlalchemy import create_engine
-from app.common.constants import DATABASE_URL
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.common.constants import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_ECHO
+from app.helpers.metrics_helper import InstrumentedQueuePool, instrument_engine
 
-engine = create_engine(DATABASE_URL, echo=True, pool_size=2, max_overflow=1)
+# Routes run on the event loop, so the engine talks to Postgres through asyncpg
+def to_async_url(url: str) -> str:
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
 
-def get_db():
-    with engine.connect() as conn:
-        yield conn
\ No newline at end of file
+engine = create_async_engine(to_async_url(DATABASE_URL), echo=DB_ECHO, pool_size=DB_POOL_SIZE,
+                             max_overflow=DB_MAX_OVERFLOW, poolclass=InstrumentedQueuePool)
+instrument_engine(engine)
+
+async def get_db():
+    async with engine.connect() as conn:
+        yield conn
+
+# Builds the VALUES clause and bind parameters for a single multi-row INSERT
+def build_values(rows: list[dict], columns: list[str], casts: dict | None = None) -> tuple[str, dict]:
+    casts = casts or {}
+    groups, params = [], {}
+    for i, row in enumerate(rows):
+        names = []
+        for column in columns:
+            params[f"{column}_{i}"] = row[column]
+            names.append(f"CAST(:{column}_{i} AS {casts[column]})" if column in casts else f":{column}_{i}")
+        groups.append("(" + ", ".join(names) + ")")
+    return ", ".join(groups), params
@@ -0,0 +1,58 @@
+import struct
+import numpy as np
+from app.common.constants import EMBEDDING_DIMENSIONS, EMBEDDING_STORAGE
+
+# Storage formats for book embeddings. "float" keeps the original float[] column; the compact
+# formats are self-describing blobs in book_embeddings.embedding_blob:
+#   float16: b"h" + float16 values                          (2 bytes per dimension)
+#   int8:    b"b" + float32 scale + int8 values             (1 byte per dimension)
+# text-embedding-3 vectors can also be truncated to EMBEDDING_DIMENSIONS and renormalized.
+
+STORAGE_FORMATS = ("float", "float16", "int8")
+STORAGE_DTYPES = {"float": np.float32, "float16": np.float16, "int8": np.int8}
+
+def truncate_embedding(embedding, dimensions: int = EMBEDDING_DIMENSIONS) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32).ravel()[:dimensions]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+def quantize_int8(vector: np.ndarray) -> tuple[np.ndarray, float]:
+    peak = float(np.abs(vector).max()) if vector.size else 0.0
+    scale = peak / 127 if peak > 0 else 1.0
+    return np.clip(np.rint(vector / scale), -127, 127).astype(np.int8), scale
+
+def encode_embedding(embedding, storage: str = EMBEDDING_STORAGE) -> bytes:
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    if storage == "float16":
+        return b"h" + vector.astype(np.float16).tobytes()
+    if storage == "int8":
+        values, scale = quantize_int8(vector)
+        return b"b" + struct.pack("<f", scale) + values.tobytes()
+    if storage == "float":
+        return b"f" + vector.astype(np.float32).tobytes()
+    raise ValueError(f"Unknown embedding storage format: {storage}")
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    blob = bytes(blob)
+    code = blob[:1]
+    if code == b"h":
+        return np.frombuffer(blob, dtype=np.float16, offset=1).astype(np.float32)
+    if code == b"b":
+        scale = struct.unpack("<f", blob[1:5])[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=5).astype(np.float32) * scale
+    if code == b"f":
+        return np.frombuffer(blob, dtype=np.float32, offset=1).copy()
+    raise ValueError("Unknown embedding blob format")
+
+# Column values for writing an embedding in the configured format
+def embedding_columns(embedding, storage: str = EMBEDDING_STORAGE) -> dict:
+    vector = truncate_embedding(embedding)
+    if storage == "float":
+        return {"embedding": vector.tolist(), "embedding_blob": None}
+    return {"embedding": None, "embedding_blob": encode_embedding(vector, storage)}
+
+# Reads an embedding from a row that has either the float[] column or a blob
+def row_embedding(row) -> np.ndarray:
+    if getattr(row, "embedding_blob", None) is not None:
+        return decode_embedding(row.embedding_blob)
+    return np.asarray(row.embedding, dtype=np.float32)
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import random
+from sqlalchemy import text
+from app.common.constants import (
+    ENRICHMENT_CONCURRENCY, ENRICHMENT_BATCH_SIZE, ENRICHMENT_MAX_ATTEMPTS, ENRICHMENT_BASE_BACKOFF,
+    ENRICHMENT_MAX_BACKOFF, ENRICHMENT_POLL_SECONDS, ENRICHMENT_LEASE_SECONDS
+)
+from app.helpers.db_helper import engine
+from app.helpers.index_helper import embedding_index, index_loaded
+from app.helpers.embedding_helper import embedding_columns
+from app.helpers.cache_helper import response_cache
+from app.helpers.llm_helper import generate_summary, generate_embedding
+from app.helpers.neighbors_helper import add_book_neighbors
+
+logger = logging.getLogger(__name__)
+
+# Adds a book to the enrichment queue, or resets its job if the book is being re-added.
+# Runs inside the caller's transaction so the book row and its job commit together.
+async def enqueue_enrichment(db, isbn: str):
+    await db.execute(
+        text('''INSERT INTO enrichment_jobs (isbn) VALUES (:isbn)
+                ON CONFLICT (isbn) DO UPDATE
+                SET status = 'pending', attempts = 0, next_attempt_at = NOW(), last_error = NULL, updated_at = NOW()'''),
+        {"isbn": isbn}
+    )
+
+async def get_enrichment_status(db, isbn: str):
+    row = (await db.execute(
+        text('''SELECT b.isbn, j.status, j.attempts, j.last_error, j.next_attempt_at, be.isbn IS NOT NULL AS enriched
+                FROM books b
+                LEFT JOIN enrichment_jobs j ON j.isbn = b.isbn
+                LEFT JOIN book_embeddings be ON be.isbn = b.isbn
+                WHERE b.isbn = :isbn'''),
+        {"isbn": isbn}
+    )).mappings().first()
+    if not row:
+        return None
+    status = row["status"] or ("done" if row["enriched"] else "missing")
+    return {
+        "isbn": row["isbn"],
+        "status": status,
+        "attempts": row["attempts"] or 0,
+        "last_error": row["last_error"],
+        "next_attempt_at": row["next_attempt_at"] if status == "pending" else None
+    }
+
+def retry_delay(attempts: int) -> float:
+    delay = min(ENRICHMENT_MAX_BACKOFF, ENRICHMENT_BASE_BACKOFF * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+# In-process worker that generates summaries and embeddings for queued books.
+# Jobs live in enrichment_jobs, so they survive restarts; a claimed job holds a lease
+# and is picked up again if its worker dies before finishing it.
+class EnrichmentWorker:
+    def __init__(self):
+        self._wake = asyncio.Event()
+        self._task = None
+        self._semaphore = asyncio.Semaphore(ENRICHMENT_CONCURRENCY)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.process_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Enrichment batch failed")
+                processed = 0
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=ENRICHMENT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def process_due(self) -> int:
+        async with engine.connect() as conn:
+            claimed = await conn.execute(
+                text('''UPDATE enrichment_jobs
+                        SET status = 'running', attempts = attempts + 1, updated_at = NOW(),
+                            next_attempt_at = NOW() + make_interval(secs => :lease)
+                        WHERE isbn IN (
+                            SELECT isbn FROM enrichment_jobs
+                            WHERE status IN ('pending', 'running') AND next_attempt_at <= NOW()
+                            ORDER BY next_attempt_at
+                            LIMIT :limit
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        RETURNING isbn, attempts'''),
+                {"lease": ENRICHMENT_LEASE_SECONDS, "limit": ENRICHMENT_BATCH_SIZE}
+            )
+            attempts = {row.isbn: row.attempts for row in claimed}
+            books = []
+            if attempts:
+                result = await conn.execute(
+                    text('''SELECT isbn, title, authors, genres, pages, publication_date FROM books WHERE isbn = ANY(:isbns)'''),
+                    {"isbns": list(attempts)}
+                )
+                books = result.fetchall()
+                orphaned = set(attempts) - {book.isbn for book in books}
+                if orphaned:
+                    await conn.execute(
+                        text('''DELETE FROM enrichment_jobs WHERE isbn = ANY(:isbns)'''),
+                        {"isbns": list(orphaned)}
+                    )
+            await conn.commit()
+
+        await asyncio.gather(*(self._enrich(book, attempts[book.isbn]) for book in books))
+        return len(attempts)
+
+    async def _enrich(self, book, attempts: int):
+        async with self._semaphore:
+            try:
+                author = book.authors[0] if book.authors else ""
+                summary = await generate_summary(book.title, author, book.isbn, "../prompts/summary_prompt.txt")
+                embedding = await generate_embedding(summary)
+                async with engine.connect() as conn:
+                    # The book may have been removed while it was being summarized. Locking its row makes a
+                    # concurrent removal wait for this transaction, so it also deletes the embedding written here.
+                    exists = (await conn.execute(
+                        text('''SELECT 1 FROM books WHERE isbn = :isbn FOR KEY SHARE'''), {"isbn": book.isbn}
+                    )).first() is not None
+                    if not exists:
+                        await conn.rollback()
+                        return
+                    await conn.execute(text('''DELETE FROM book_embeddings WHERE isbn = :isbn'''), {"isbn": book.isbn})
+                    await conn.execute(
+                        text('''INSERT INTO book_embeddings(isbn, summary, embedding, embedding_blob)
+                                VALUES (:isbn, :summary, :embedding, :embedding_blob)'''),
+                        {"isbn": book.isbn, "summary": summary, **embedding_columns(embedding)}
+                    )
+                    await conn.execute(
+                        text('''UPDATE enrichment_jobs SET status = 'done', last_error = NULL, updated_at = NOW()
+                                WHERE isbn = :isbn'''),
+                        {"isbn": book.isbn}
+                    )
+                    await conn.commit()
+                if await index_loaded():
+                    await asyncio.to_thread(embedding_index.add, book.isbn, book.title, book.authors, embedding,
+                                            book.genres, book.pages, book.publication_date)
+                response_cache.invalidate(f"book:{book.isbn}")
+                await add_book_neighbors([book.isbn])
+            except Exception as e:
+                logger.warning("Enrichment of %s failed (attempt %d): %s", book.isbn, attempts, e)
+                status = "failed" if attempts >= ENRICHMENT_MAX_ATTEMPTS else "pending"
+                async with engine.connect() as conn:
+                    await conn.execute(
+                        text('''UPDATE enrichment_jobs
+                                SET status = :status, last_error = :error, updated_at = NOW(),
+                                    next_attempt_at = NOW() + make_interval(secs => :delay)
+                                WHERE isbn = :isbn'''),
+                        {"status": status, "error": str(e), "delay": retry_delay(attempts), "isbn": book.isbn}
+                    )
+                    await conn.commit()
+                response_cache.invalidate(f"book:{book.isbn}")
+
+enrichment_worker = EnrichmentWorker()
@@ -0,0 +1,441 @@
+import asyncio
+import os
+import threading
+import time
+import numpy as np
+from sqlalchemy import text
+from app.common.constants import (
+    EMBEDDING_DIMENSIONS, EMBEDDING_STORAGE, INDEX_BLOCK_ROWS, EMBEDDING_SNAPSHOT_DIR,
+    EMBEDDING_SNAPSHOT_POLL_SECONDS, EMBEDDING_SNAPSHOTS_KEPT, SEARCH_LEXICAL_WEIGHT, SEARCH_PRECISE_SCORE
+)
+from app.helpers.db_helper import engine
+from app.helpers.embedding_helper import STORAGE_DTYPES, truncate_embedding, quantize_int8, row_embedding
+from app.helpers.search_helper import LexicalIndex, publication_year
+from app.helpers.snapshot_helper import SnapshotLock, open_snapshot, read_current, write_snapshot, prune_snapshots, snapshot_version
+
+# Process-resident index of book embeddings. Vectors are kept pre-normalized in one matrix
+# so a query is ranked with matrix-vector products. The matrix uses the configured storage
+# format (float32, float16, or int8 with a per-row scale) and is scored in float32 blocks
+# of INDEX_BLOCK_ROWS rows, so compact formats also shrink the resident index.
+# Searches are hybrid: structured filters and precise lexical matches narrow the rows that
+# get vector-scored, and the final ranking fuses cosine similarity with the lexical score.
+
+# updated_at stamps when this copy of the book entered the index; answer caching keys on it
+def book_details(title, authors, genres=None, pages=None, publication_date=None, updated_at=0.0) -> dict:
+    return {
+        "title": title,
+        "authors": authors,
+        "genres": genres or [],
+        "pages": pages,
+        "year": publication_year(publication_date),
+        "updated_at": updated_at
+    }
+
+class EmbeddingIndex:
+    def __init__(self, storage: str = EMBEDDING_STORAGE, dimensions: int = EMBEDDING_DIMENSIONS):
+        self._lock = threading.Lock()
+        self.storage = storage
+        self.dimensions = dimensions
+        self._dtype = STORAGE_DTYPES[storage]
+        self._lexical = LexicalIndex()
+        self._reset(0, 0)
+        self.loaded = False
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, isbn):
+        return isbn in self._rows
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix[:self._size].nbytes + self._scales[:self._size].nbytes
+
+    def _normalize(self, embedding):
+        return truncate_embedding(embedding, self.dimensions)
+
+    def _reset(self, capacity, dim):
+        self._matrix = np.empty((capacity, dim), dtype=self._dtype)
+        self._scales = np.ones(capacity, dtype=np.float32)
+        # Unknown page counts and years are NaN, which fails every range filter
+        self._pages = np.full(capacity, np.nan, dtype=np.float32)
+        self._years = np.full(capacity, np.nan, dtype=np.float32)
+        self._size = 0
+        self._isbns = []
+        self._books = []
+        self._rows = {}
+        self._lexical.clear()
+
+    # Grows the backing arrays geometrically so repeated adds are amortized O(dim)
+    def _reserve(self, dim):
+        capacity, current_dim = self._matrix.shape
+        if current_dim != dim:
+            if self._size:
+                raise ValueError(f"Embedding dimension {dim} does not match index dimension {current_dim}")
+            self._reset(max(capacity, 16), dim)
+        elif self._size >= capacity:
+            grown = max(16, capacity * 2)
+            for name, fill in (("_matrix", None), ("_scales", 1.0), ("_pages", np.nan), ("_years", np.nan)):
+                current = getattr(self, name)
+                array = np.empty((grown,) + current.shape[1:], dtype=current.dtype)
+                if fill is not None:
+                    array.fill(fill)
+                array[:self._size] = current[:self._size]
+                setattr(self, name, array)
+
+    def _store(self, row, isbn, vector, book):
+        if self.storage == "int8":
+            self._matrix[row], self._scales[row] = quantize_int8(vector)
+        else:
+            self._matrix[row] = vector
+        self._pages[row] = book["pages"] if book["pages"] is not None else np.nan
+        self._years[row] = book["year"] if book["year"] is not None else np.nan
+        self._books[row] = book
+        self._lexical.add(isbn, book)
+
+    # rows carry isbn, title and authors plus an embedding (float[] column or blob), and
+    # optionally genres, pages and publication_date for filtering
+    def load(self, rows):
+        rows = list(rows)
+        loaded_at = time.time()
+        with self._lock:
+            self._reset(0, 0)
+            for row in rows:
+                if row.isbn in self._rows:
+                    continue
+                vector = self._normalize(row_embedding(row))
+                if self._size == 0:
+                    self._reset(len(rows), vector.shape[0])
+                self._rows[row.isbn] = self._size
+                self._isbns.append(row.isbn)
+                self._books.append(None)
+                self._store(self._size, row.isbn, vector, book_details(
+                    row.title, row.authors, getattr(row, "genres", None), getattr(row, "pages", None),
+                    getattr(row, "publication_date", None), loaded_at
+                ))
+                self._size += 1
+            self.loaded = True
+
+    def add(self, isbn, title, authors, embedding, genres=None, pages=None, publication_date=None):
+        vector = self._normalize(embedding)
+        with self._lock:
+            row = self._rows.get(isbn)
+            if row is None:
+                self._reserve(vector.shape[0])
+                row = self._size
+                self._rows[isbn] = row
+                self._isbns.append(isbn)
+                self._books.append(None)
+                self._size += 1
+            self._store(row, isbn, vector, book_details(title, authors, genres, pages, publication_date, time.time()))
+
+    # entries are tuples of add() arguments
+    def add_many(self, entries):
+        for entry in entries:
+            self.add(*entry)
+
+    # Removes a book by moving the last row into its slot, keeping the arrays dense
+    def remove(self, isbn):
+        with self._lock:
+            row = self._rows.pop(isbn, None)
+            if row is None:
+                return
+            self._lexical.remove(isbn)
+            last = self._size - 1
+            if row != last:
+                for array in (self._matrix, self._scales, self._pages, self._years):
+                    array[row] = array[last]
+                self._isbns[row] = self._isbns[last]
+                self._books[row] = self._books[last]
+                self._rows[self._isbns[row]] = row
+            self._isbns.pop()
+            self._books.pop()
+            self._size = last
+
+    # Serves a mapped snapshot in place; the index is read-only afterwards
+    def attach(self, snapshot):
+        with self._lock:
+            self._reset(0, 0)
+            self._matrix = snapshot.matrix
+            self._scales = snapshot.scales
+            self._isbns = list(snapshot.isbns)
+            self._books = [book_details(book["title"], book["authors"]) | book for book in snapshot.books]
+            self._rows = {isbn: row for row, isbn in enumerate(self._isbns)}
+            self._size = len(self._isbns)
+            self._pages = np.array([np.nan if book["pages"] is None else book["pages"] for book in self._books],
+                                   dtype=np.float32)
+            self._years = np.array([np.nan if book["year"] is None else book["year"] for book in self._books],
+                                   dtype=np.float32)
+            for isbn, book in zip(self._isbns, self._books):
+                self._lexical.add(isbn, book)
+            self.loaded = True
+
+    # Only a shared index can change behind this process's back
+    @property
+    def stale(self) -> bool:
+        return False
+
+    def refresh(self, force: bool = False) -> bool:
+        return self.loaded
+
+    # The stored (normalized, dequantized) vector of a book, or None if it is not indexed
+    def vector(self, isbn):
+        with self._lock:
+            row = self._rows.get(isbn)
+            if row is None:
+                return None
+            return self._matrix[row].astype(np.float32) * self._scales[row]
+
+    # Snapshot part for write_snapshot: (matrix, scales, isbns, books)
+    def arrays(self):
+        with self._lock:
+            return (self._matrix[:self._size], self._scales[:self._size], list(self._isbns), list(self._books))
+
+    async def load_from(self, fetch_rows):
+        self.load(await fetch_rows())
+
+    # Cosine similarity of the query against `rows` (all rows when None)
+    def _scores(self, query, rows=None):
+        count = self._size if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, INDEX_BLOCK_ROWS):
+            end = min(start + INDEX_BLOCK_ROWS, count)
+            block = self._matrix[start:end] if rows is None else self._matrix[rows[start:end]]
+            scores[start:end] = (block if block.dtype == np.float32 else block.astype(np.float32)) @ query
+        if self.storage == "int8":
+            scores *= self._scales[:self._size] if rows is None else self._scales[rows]
+        return scores
+
+    # Row numbers passing the structured filters, or None when there are no filters
+    def _filter_rows(self, filters):
+        if not filters:
+            return None
+        mask = np.ones(self._size, dtype=bool)
+        if filters.genre is not None:
+            genre_mask = np.zeros(self._size, dtype=bool)
+            genre_mask[[self._rows[isbn] for isbn in self._lexical.genre_matches(filters.genre)]] = True
+            mask &= genre_mask
+        for values, low, high in ((self._pages, filters.min_pages, filters.max_pages),
+                                  (self._years, filters.min_year, filters.max_year)):
+            if low is not None:
+                mask &= values[:self._size] >= low
+            if high is not None:
+                mask &= values[:self._size] <= high
+        return np.flatnonzero(mask)
+
+    # query_text enables lexical matching and fusion; filters are hard constraints
+    def search(self, query_embedding, k=3, query_text=None, filters=None):
+        query = self._normalize(query_embedding)
+        with self._lock:
+            if self._size == 0 or k <= 0:
+                return []
+            rows = self._filter_rows(filters)
+            lexical = np.zeros(self._size, dtype=np.float32)
+            for isbn, score in self._lexical.score(query_text).items():
+                lexical[self._rows[isbn]] = score
+            candidates = np.arange(self._size) if rows is None else rows
+            # A precise title/author match with at least k hits only needs its hits vector-scored
+            hits = candidates[lexical[candidates] > 0]
+            if len(hits) >= k and lexical[hits].max() >= SEARCH_PRECISE_SCORE:
+                rows = hits
+            if rows is not None and len(rows) == 0:
+                return []
+
+            similarity = self._scores(query, rows)
+            lexical = lexical if rows is None else lexical[rows]
+            fused = (1 - SEARCH_LEXICAL_WEIGHT) * similarity + SEARCH_LEXICAL_WEIGHT * lexical
+            k = min(k, len(fused))
+            top = np.argpartition(-fused, k - 1)[:k]
+            top = top[np.argsort(-fused[top])]
+            results = []
+            for i in top:
+                row = i if rows is None else rows[i]
+                book = self._books[row]
+                results.append({
+                    "isbn": self._isbns[row],
+                    "title": book["title"],
+                    "authors": book["authors"],
+                    "genres": book["genres"],
+                    "pages": book["pages"],
+                    "year": book["year"],
+                    "updated_at": book["updated_at"],
+                    "similarity": float(similarity[i]),
+                    "lexical_score": float(lexical[i]),
+                    "score": float(fused[i])
+                })
+            return results
+
+# Multi-worker index backed by the memory-mapped snapshot in EMBEDDING_SNAPSHOT_DIR. Every worker
+# maps the CURRENT snapshot read-only and re-checks it at most every EMBEDDING_SNAPSHOT_POLL_SECONDS.
+# Adds and removes write a new snapshot version under the snapshot lock and swap CURRENT,
+# so the first worker to load reads Postgres and later cold starts just map the file.
+class SharedEmbeddingIndex:
+    def __init__(self, directory: str, storage: str = EMBEDDING_STORAGE, dimensions: int = EMBEDDING_DIMENSIONS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.storage = storage
+        self.dimensions = dimensions
+        self.lock = SnapshotLock(directory)
+        self._index = EmbeddingIndex(storage, dimensions)
+        self._snapshot_name = None
+        self._checked_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, isbn):
+        return isbn in self._index
+
+    @property
+    def nbytes(self) -> int:
+        return self._index.nbytes
+
+    # Only reports the snapshot mapped by the last refresh; index_loaded() refreshes first when one is due
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot_name is not None
+
+    @property
+    def stale(self) -> bool:
+        return time.monotonic() - self._checked_at >= EMBEDDING_SNAPSHOT_POLL_SECONDS
+
+    # Returns the named snapshot, or None if it is missing or was built with other storage settings
+    def _open(self, name):
+        if name is None:
+            return None
+        try:
+            snapshot = open_snapshot(self.directory, name)
+        except (FileNotFoundError, ValueError):
+            return None
+        # Rows of another width cannot be merged with new ones, so any EMBEDDING_DIMENSIONS change needs a rebuild
+        if snapshot.storage != self.storage or snapshot.dimensions != self.dimensions:
+            return None
+        return snapshot
+
+    def _attach(self, snapshot):
+        index = EmbeddingIndex(self.storage, self.dimensions)
+        index.attach(snapshot)
+        self._index, self._snapshot_name = index, snapshot.name
+
+    # Maps CURRENT if another worker swapped it; returns whether a usable snapshot is mapped.
+    # Attaching parses every book's metadata, so this runs in a thread (index_loaded() or search()).
+    def refresh(self, force: bool = False) -> bool:
+        with self._refresh_lock:
+            if force or self.stale:
+                self._checked_at = time.monotonic()
+                name = read_current(self.directory)
+                if name != self._snapshot_name:
+                    snapshot = self._open(name)
+                    if snapshot is not None:
+                        self._attach(snapshot)
+                    else:
+                        self._index, self._snapshot_name = EmbeddingIndex(self.storage, self.dimensions), None
+        return self._snapshot_name is not None
+
+    def vector(self, isbn):
+        return self._index.vector(isbn)
+
+    def search(self, query_embedding, k=3, query_text=None, filters=None):
+        self.refresh()
+        return self._index.search(query_embedding, k, query_text, filters)
+
+    def _publish(self, parts):
+        name = write_snapshot(self.directory, snapshot_version(read_current(self.directory) or "") + 1,
+                              self.storage, self.dimensions, parts)
+        prune_snapshots(self.directory, EMBEDDING_SNAPSHOTS_KEPT)
+        self._attach(open_snapshot(self.directory, name))
+
+    def _publish_rows(self, rows):
+        staged = EmbeddingIndex(self.storage, self.dimensions)
+        staged.load(rows)
+        self._publish([staged.arrays()])
+
+    # Writes CURRENT minus `removed`, plus `added`. Kept rows are passed as contiguous slices of the
+    # mapped matrix, so the previous snapshot is streamed into the new file rather than copied in memory.
+    def _apply(self, added, removed):
+        current = self._open(read_current(self.directory))
+        if current is None:
+            # Nothing published yet; the next cold load reads these books from Postgres
+            return
+        dropped = set(removed) | {entry[0] for entry in added}
+        positions = [row for row, isbn in enumerate(current.isbns) if isbn in dropped]
+        if not positions and not added:
+            return
+        parts, start = [], 0
+        for end in positions + [len(current.isbns)]:
+            if end > start:
+                parts.append((current.matrix[start:end], current.scales[start:end],
+                              current.isbns[start:end], current.books[start:end]))
+            start = end + 1
+        staged = EmbeddingIndex(self.storage, self.dimensions)
+        staged.add_many(added)
+        parts.append(staged.arrays())
+        self._publish(parts)
+
+    def add(self, isbn, title, authors, embedding, genres=None, pages=None, publication_date=None):
+        self.add_many([(isbn, title, authors, embedding, genres, pages, publication_date)])
+
+    def add_many(self, entries):
+        with self.lock:
+            self._apply(list(entries), ())
+
+    def remove(self, isbn):
+        with self.lock:
+            self._apply((), [isbn])
+
+    # Publishes a snapshot of exactly these rows, replacing whatever is CURRENT
+    def load(self, rows):
+        with self.lock:
+            self._publish_rows(rows)
+
+    # Builds the first snapshot from Postgres unless another worker publishes one while we wait for the lock
+    async def load_from(self, fetch_rows):
+        acquire = asyncio.ensure_future(asyncio.to_thread(self.lock.acquire))
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # The thread still takes the lock after we are cancelled, so hand it back once it does
+            def release(task):
+                if not task.cancelled() and task.exception() is None:
+                    self.lock.release()
+            acquire.add_done_callback(release)
+            raise
+        try:
+            if await asyncio.to_thread(self.refresh, True):
+                return
+            rows = await fetch_rows()
+            await asyncio.to_thread(self._publish_rows, rows)
+        finally:
+            self.lock.release()
+
+embedding_index = SharedEmbeddingIndex(EMBEDDING_SNAPSHOT_DIR) if EMBEDDING_SNAPSHOT_DIR else EmbeddingIndex()
+_load_lock = asyncio.Lock()
+
+async def fetch_index_rows(db):
+    result = await db.execute(
+        text('''SELECT b.isbn, b.title, b.authors, b.genres, b.pages, b.publication_date, be.embedding_blob,
+                       CASE WHEN be.embedding_blob IS NULL THEN be.embedding END AS embedding
+                FROM books b JOIN book_embeddings be ON b.isbn = be.isbn'''))
+    return result.fetchall()
+
+async def load_index(db):
+    embedding_index.load(await fetch_index_rows(db))
+
+async def _fetch_index_rows():
+    async with engine.connect() as conn:
+        return await fetch_index_rows(conn)
+
+# Whether the index is loaded, first mapping a newer shared snapshot off the event loop if a check is due
+async def index_loaded() -> bool:
+    if embedding_index.stale:
+        await asyncio.to_thread(embedding_index.refresh)
+    return embedding_index.loaded
+
+# Loads the index on first use with a short-lived connection that is returned before any streaming starts
+async def ensure_index_loaded():
+    if await index_loaded():
+        return
+    async with _load_lock:
+        if not embedding_index.loaded:
+            await embedding_index.load_from(_fetch_index_rows)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from collections import Counter
+from sqlalchemy import text
+from app.common.constants import LIKE_FLUSH_SECONDS, LIKE_FLUSH_MAX_ATTEMPTS, INSERT_BATCH_SIZE
+from app.helpers.db_helper import engine, build_values
+from app.helpers.cache_helper import response_cache
+from app.helpers.review_stats_helper import apply_like_changes
+
+logger = logging.getLogger(__name__)
+
+# Write-behind buffer for review likes. Events are coalesced per (review_id, account_id),
+# so only the latest like/unlike for a pair is written, and the buffer flushes every
+# LIKE_FLUSH_SECONDS in transactions of at most INSERT_BATCH_SIZE pairs of batched, idempotent statements.
+# A batch that fails is retried on the next flushes and dropped after LIKE_FLUSH_MAX_ATTEMPTS.
+
+class LikeBuffer:
+    def __init__(self):
+        self._pending = {}
+        self._flushing = {}
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+
+    def _entry(self, review_id: int, account_id: int):
+        key = (review_id, account_id)
+        return self._pending.get(key) or self._flushing.get(key)
+
+    # Whether the pair is liked, as far as this process knows; None when it has to be read from the database
+    def current_state(self, review_id: int, account_id: int) -> bool | None:
+        entry = self._entry(review_id, account_id)
+        return entry["liked"] if entry else None
+
+    # baseline is the committed state of the pair, read by the caller the first time the pair is buffered
+    def record(self, review_id: int, account_id: int, isbn: str, liked: bool, baseline: bool):
+        key = (review_id, account_id)
+        entry = self._entry(review_id, account_id)
+        if entry:
+            baseline = entry["baseline"]
+        self._pending[key] = {"isbn": isbn, "liked": liked, "baseline": baseline}
+
+    def _entries(self):
+        return {**self._flushing, **self._pending}
+
+    # Net change to each review's like count that has not been written yet
+    def pending_deltas(self) -> Counter:
+        deltas = Counter()
+        for (review_id, _), entry in self._entries().items():
+            deltas[review_id] += int(entry["liked"]) - int(entry["baseline"])
+        return deltas
+
+    # Pending like state of every review of a book for one account
+    def pending_likes(self, account_id: int, isbn: str) -> dict:
+        return {
+            review_id: entry["liked"]
+            for (review_id, pending_account_id), entry in self._entries().items()
+            if pending_account_id == account_id and entry["isbn"] == isbn
+        }
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            try:
+                ordered = sorted(self._flushing.items())
+                for start in range(0, len(ordered), INSERT_BATCH_SIZE):
+                    batch = dict(ordered[start:start + INSERT_BATCH_SIZE])
+                    try:
+                        await self._write(batch)
+                    except Exception:
+                        logger.exception("Flushing %d buffered likes failed", len(batch))
+                        self._retry(batch)
+                        continue
+                    # Events recorded during the write now start from the state that was just committed
+                    for key, entry in batch.items():
+                        if key in self._pending:
+                            self._pending[key]["baseline"] = entry["liked"]
+            finally:
+                self._flushing = {}
+
+    # Puts a failed batch back for the next flush; newer events for a pair win, and pairs that
+    # keep failing are dropped so they cannot hold up the rest of the buffer
+    def _retry(self, batch: dict):
+        dropped = 0
+        for key, entry in batch.items():
+            attempts = entry.get("attempts", 0) + 1
+            if attempts >= LIKE_FLUSH_MAX_ATTEMPTS:
+                dropped += 1
+                continue
+            self._pending.setdefault(key, {**entry, "attempts": attempts})
+        if dropped:
+            logger.error("Dropped %d buffered likes after %d failed flushes", dropped, LIKE_FLUSH_MAX_ATTEMPTS)
+
+    # Inserts and deletes report the rows they actually changed, and the counters are moved by exactly
+    # that amount, so replays and duplicate events cannot make reviews.likes or the review stats drift
+    async def _write(self, entries: dict):
+        ordered = entries.items()
+        likes = [{"review_id": review_id, "account_id": account_id, "isbn": entry["isbn"]}
+                 for (review_id, account_id), entry in ordered if entry["liked"]]
+        unlikes = [{"review_id": review_id, "account_id": account_id}
+                   for (review_id, account_id), entry in ordered if not entry["liked"]]
+        deltas = Counter()
+
+        async with engine.connect() as conn:
+            if likes:
+                values, params = build_values(likes, ["review_id", "account_id", "isbn"],
+                                              casts={"review_id": "BIGINT", "account_id": "BIGINT", "isbn": "TEXT"})
+                inserted = await conn.execute(
+                    text(f'''INSERT INTO review_likes (review_id, account_id, isbn)
+                             SELECT v.review_id, v.account_id, v.isbn
+                             FROM (VALUES {values}) AS v(review_id, account_id, isbn)
+                             WHERE EXISTS (SELECT 1 FROM reviews r WHERE r.review_id = v.review_id)
+                             ON CONFLICT (review_id, account_id) DO NOTHING
+                             RETURNING review_id'''),
+                    params
+                )
+                deltas.update(row.review_id for row in inserted)
+            if unlikes:
+                values, params = build_values(unlikes, ["review_id", "account_id"],
+                                              casts={"review_id": "BIGINT", "account_id": "BIGINT"})
+                deleted = await conn.execute(
+                    text(f'''DELETE FROM review_likes
+                             WHERE (review_id, account_id) IN (SELECT * FROM (VALUES {values}) AS v(review_id, account_id))
+                             RETURNING review_id'''),
+                    params
+                )
+                deltas.subtract(row.review_id for row in deleted)
+            changed = [{"review_id": review_id, "delta": delta} for review_id, delta in sorted(deltas.items()) if delta]
+            if changed:
+                values, params = build_values(changed, ["review_id", "delta"],
+                                              casts={"review_id": "BIGINT", "delta": "INTEGER"})
+                updated = await conn.execute(
+                    text(f'''UPDATE reviews r SET likes = r.likes + v.delta
+                             FROM (VALUES {values}) AS v(review_id, delta)
+                             WHERE r.review_id = v.review_id
+                             RETURNING r.account_id, r.book_isbn, v.delta'''),
+                    params
+                )
+                await apply_like_changes(conn, updated.mappings().all())
+            await conn.commit()
+        if changed:
+            response_cache.invalidate("review_stats")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(LIKE_FLUSH_SECONDS)
+            await self.flush()
+
+like_buffer = LikeBuffer()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from app.common.constants import LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES
+from app.helpers.metrics_helper import Counter
+
+# Content-addressed store for model outputs we have already paid for. Keys hash the model,
+# the prompt template and the inputs, so any change to one of them is a different entry.
+# Entries live in a local SQLite file and the least recently used ones are evicted first.
+
+LLM_CACHE_REQUESTS = Counter("llm_cache_requests_total", "LLM result cache lookups", ("kind", "result"))
+
+def cache_key(model: str, template_hash: str, inputs: dict) -> str:
+    payload = json.dumps([model, template_hash, inputs], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class LLMResultCache:
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._count = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS results (
+                                      key TEXT PRIMARY KEY,
+                                      kind TEXT NOT NULL,
+                                      value BLOB NOT NULL,
+                                      last_used REAL NOT NULL
+                                  )''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used_idx ON results (last_used)")
+            self._conn.commit()
+        return self._conn
+
+    # Returns {key: value} for the keys that are cached and marks them as recently used
+    def get_many(self, kind: str, keys: list[str]) -> dict:
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE results SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                conn.commit()
+        hits = len(set(found))
+        self.hits += hits
+        self.misses += len(set(keys)) - hits
+        LLM_CACHE_REQUESTS.inc(hits, kind=kind, result="hit")
+        LLM_CACHE_REQUESTS.inc(len(set(keys)) - hits, kind=kind, result="miss")
+        return found
+
+    def get(self, kind: str, key: str):
+        return self.get_many(kind, [key]).get(key)
+
+    def put_many(self, kind: str, entries: dict):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (key, kind, value, last_used) VALUES (?, ?, ?, ?)",
+                [(key, kind, value, now) for key, value in entries.items()]
+            )
+            # Upper bound on the row count, so the table is only counted when eviction may be due
+            if self._count is None:
+                self._count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            else:
+                self._count += len(entries)
+            if self._count > self.max_entries:
+                self._count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                if self._count > self.max_entries:
+                    # Evict down to 90% of capacity so eviction does not run on every insert
+                    evicted = self._count - int(self.max_entries * 0.9)
+                    conn.execute(
+                        "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                        (evicted,)
+                    )
+                    self._count -= evicted
+            conn.commit()
+
+    def put(self, kind: str, key: str, value: bytes):
+        self.put_many(kind, {key: value})
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+llm_cache = LLMResultCache(LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES)
@@ -0,0 +1,221 @@
+import asyncio
+import random
+import time
+import openai
+from openai import AsyncOpenAI
+from app.common.constants import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, EMBEDDING_BATCH_SIZE, EMBEDDING_DIMENSIONS, LLM_MAX_CONCURRENCY,
+    LLM_MAX_STREAMS, LLM_BATCH_WINDOW_MS, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_ATTEMPTS,
+    LLM_BASE_BACKOFF, LLM_MAX_BACKOFF, LLM_TIMEOUT
+)
+from app.helpers.metrics_helper import Counter, Histogram, UPSTREAM_SECONDS
+
+# Single path for every OpenAI call. The gateway
+#   - coalesces concurrent embedding requests into list-input calls (up to EMBEDDING_BATCH_SIZE
+#     texts, waiting at most LLM_BATCH_WINDOW_MS for a batch to fill),
+#   - runs identical in-flight requests once (singleflight),
+#   - spends from a requests/tokens per minute budget before each call and bounds concurrency,
+#   - retries rate limits, timeouts and 5xx answers with jittered exponential backoff.
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+# text-embedding-3 models shorten vectors server-side when asked for fewer dimensions
+EMBEDDING_OPTIONS = {"dimensions": EMBEDDING_DIMENSIONS} if EMBEDDING_DIMENSIONS < 3072 else {}
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+LLM_RETRIES = Counter("llm_gateway_retries_total", "Retried OpenAI calls", ("operation", "reason"))
+LLM_COALESCED = Counter("llm_gateway_coalesced_total", "Requests served by an identical in-flight request", ("kind",))
+LLM_BUDGET_WAIT_SECONDS = Counter("llm_gateway_budget_wait_seconds_total", "Time spent waiting for the rate budget")
+LLM_BATCH_SIZE = Histogram(
+    "llm_gateway_embedding_batch_size", "Texts per coalesced embedding call", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+
+# Rough count used for budgeting; about four characters per token for English text
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def retry_delay(attempt: int, error: Exception) -> float:
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_MAX_BACKOFF)
+        except ValueError:
+            pass
+    return min(LLM_MAX_BACKOFF, LLM_BASE_BACKOFF * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+# Requests and tokens per minute as two token buckets; callers wait in arrival order until both have room
+class RateBudget:
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    async def acquire(self, tokens: int):
+        if self.requests_per_minute <= 0 and self.tokens_per_minute <= 0:
+            return
+        # A request larger than the whole budget waits for a full bucket rather than forever
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                self._refill()
+                waits = [0.0]
+                if self.requests_per_minute > 0 and self._requests < 1:
+                    waits.append((1 - self._requests) * 60 / self.requests_per_minute)
+                if self.tokens_per_minute > 0 and self._tokens < tokens:
+                    waits.append((tokens - self._tokens) * 60 / self.tokens_per_minute)
+                wait = max(waits)
+                if wait <= 0:
+                    self._requests -= 1 if self.requests_per_minute > 0 else 0
+                    self._tokens -= tokens if self.tokens_per_minute > 0 else 0
+                    return
+                LLM_BUDGET_WAIT_SECONDS.inc(wait)
+                await asyncio.sleep(wait)
+
+# Runs one call per key at a time; concurrent callers with the same key share its result.
+# The call runs as its own task, so a caller that is cancelled does not cancel it for the others.
+class SingleFlight:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._calls = {}
+
+    def _done(self, key, task):
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, call):
+        task = self._calls.get(key)
+        if task is not None:
+            LLM_COALESCED.inc(kind=self.kind)
+        else:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task)
+
+# Collects embedding requests for up to LLM_BATCH_WINDOW_MS and sends them as one list-input call
+class EmbeddingBatcher:
+    def __init__(self, send, batch_size: int, window: float):
+        self._send = send
+        self.batch_size = batch_size
+        self.window = window
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, text: str) -> list[float]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        LLM_BATCH_SIZE.observe(len(batch))
+        try:
+            embeddings = await self._send([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+class LLMGateway:
+    def __init__(self):
+        self._client = None
+        self.budget = RateBudget(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+        self._requests = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        self._streams = asyncio.Semaphore(LLM_MAX_STREAMS)
+        self._embedding_flights = SingleFlight("embedding")
+        self._response_flights = SingleFlight("response")
+        self._batcher = EmbeddingBatcher(self._embed_batch, EMBEDDING_BATCH_SIZE, LLM_BATCH_WINDOW_MS / 1000)
+
+    # The gateway does its own retrying, so the SDK's is turned off
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=OPENAI_API_KEY or "unset", base_url=OPENAI_BASE_URL or None,
+                                       max_retries=0, timeout=LLM_TIMEOUT)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    # Spends budget, takes a concurrency slot and retries the request; timed per attempt unless operation is None
+    async def _call(self, operation: str | None, tokens: int, request):
+        attempt = 1
+        while True:
+            await self.budget.acquire(tokens)
+            try:
+                async with self._requests:
+                    if operation is None:
+                        return await request()
+                    with UPSTREAM_SECONDS.time(service="openai", operation=operation):
+                        return await request()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= LLM_MAX_ATTEMPTS:
+                    raise
+                LLM_RETRIES.inc(operation=operation or "stream", reason=type(e).__name__)
+                await asyncio.sleep(retry_delay(attempt, e))
+                attempt += 1
+
+    async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        response = await self._call(
+            "embedding_batch", sum(map(estimate_tokens, texts)),
+            lambda: self.client.embeddings.create(input=texts, model=EMBEDDING_MODEL, **EMBEDDING_OPTIONS)
+        )
+        embeddings = [None] * len(texts)
+        for item in response.data:
+            embeddings[item.index] = item.embedding
+        return embeddings
+
+    async def embed(self, text: str) -> list[float]:
+        return await self._embedding_flights.do(text, lambda: self._batcher.submit(text))
+
+    async def embed_many(self, texts: list[str]) -> list[list[float]]:
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    # Non-streaming Responses API call; calls with the same key while one is in flight share it
+    async def create_response(self, key, operation: str, **params):
+        tokens = estimate_tokens(str(params.get("input", ""))) + params.get("max_output_tokens", 0)
+        return await self._response_flights.do(
+            key, lambda: self._call(operation, tokens, lambda: self.client.responses.create(**params))
+        )
+
+    # Streams Responses API events. Opening the stream is retried; a stream that fails midway is not,
+    # since part of it has already been sent to the client.
+    async def stream_response(self, **params):
+        tokens = estimate_tokens(str(params.get("input", ""))) + params.get("max_output_tokens", 0)
+        async with self._streams:
+            stream = await self._call(None, tokens, lambda: self.client.responses.create(stream=True, **params))
+            async for event in stream:
+                yield event
+
+llm_gateway = LLMGateway()
@@ -1,29 +1,61 @@
+import asyncio
+import functools
+import hashlib
 import os
+from collections import OrderedDict
 import numpy as np
-from openai import OpenAI
-from app.common.constants import OPENAI_API_KEY
+from app.common.constants import QUERY_EMBEDDING_CACHE_SIZE
+from app.helpers.index_helper import embedding_index
+from app.helpers.metrics_helper import UPSTREAM_SECONDS
+from app.helpers.llm_cache_helper import llm_cache, cache_key
+from app.helpers.llm_gateway_helper import llm_gateway, EMBEDDING_MODEL, EMBEDDING_OPTIONS
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+SUMMARY_MODEL = "gpt-3.5-turbo"
 
+# Prompt templates are read from disk once per process
+@functools.lru_cache(maxsize=None)
 def load_prompt(filepath: str) -> str:
     base_dir = os.path.dirname(os.path.abspath(__file__))
     full_path = os.path.join(base_dir, filepath)
     with open(full_path, 'r', encoding='utf-8') as file:
         return file.read()
-    
-def generate_summary(title: str, author: str, isbn: str, prompt_path: str) -> str:
+
+@functools.lru_cache(maxsize=None)
+def prompt_hash(filepath: str) -> str:
+    return hashlib.sha256(load_prompt(filepath).encode()).hexdigest()
+
+def _embedding_key(text: str) -> str:
+    return cache_key(EMBEDDING_MODEL, "", {"input": text, **EMBEDDING_OPTIONS})
+
+def _encode_embedding(embedding) -> bytes:
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+def _decode_embedding(value: bytes) -> list[float]:
+    return np.frombuffer(value, dtype=np.float32).tolist()
+
+async def generate_summary(title: str, author: str, isbn: str, prompt_path: str) -> str:
+    key = cache_key(SUMMARY_MODEL, prompt_hash(prompt_path),
+                    {"title": title, "author": author, "isbn": isbn, "max_output_tokens": 400})
+    cached = await asyncio.to_thread(llm_cache.get, "summary", key)
+    if cached is not None:
+        return cached.decode()
+
     prompt_template = load_prompt(prompt_path)
     prompt = prompt_template.format(title=title, author=author, isbn=isbn)
-    
-    response = client.responses.create(
-        model="gpt-3.5-turbo",
+
+    # Concurrent requests for the same summary (an import racing the enrichment worker) share one call
+    response = await llm_gateway.create_response(
+        key,
+        "summary",
+        model=SUMMARY_MODEL,
         input=prompt,
         max_output_tokens=400
     )
 
+    await asyncio.to_thread(llm_cache.put, "summary", key, response.output_text.encode())
     return response.output_text
 
-def generate_query_response(query: str, most_similar, prompt_path: str):
+async def generate_query_response(query: str, most_similar, prompt_path: str):
     prompt_template = load_prompt(prompt_path)
 
     context_parts = []
@@ -34,48 +66,76 @@ def generate_query_response(query: str, most_similar, prompt_path: str):
             f"Book {i + 1} Title: {title}\nAuthor: {author}\n"
         )
     
-    context_text = "\n---\n".join(context_parts)
+    # Books still waiting on enrichment are not in the index yet, so the list can be empty
+    context_text = "\n---\n".join(context_parts) if context_parts else "No books are available yet."
     prompt = prompt_template.format(context=context_text, query=query)
 
-    stream = client.responses.create(
-        model="gpt-3.5-turbo",
-        input=prompt,
-        max_output_tokens=400,
-        stream=True
-    )
+    with UPSTREAM_SECONDS.time(service="openai", operation="chat"):
+        stream = llm_gateway.stream_response(
+            model=SUMMARY_MODEL,
+            input=prompt,
+            max_output_tokens=400
+        )
 
-    for chunk in stream:
-        if chunk.type == 'response.output_text.delta':
-            content_part = chunk.delta
-            if content_part:
-                yield content_part
+        async for chunk in stream:
+            if chunk.type == 'response.output_text.delta':
+                content_part = chunk.delta
+                if content_part:
+                    yield content_part
 
-def generate_embedding(text: str) -> list[float]:
-    response = client.embeddings.create(
-        input=text,
-        model="text-embedding-3-large"
-    )
-    embedding_vector = response.data[0].embedding
+async def generate_embedding(text: str) -> list[float]:
+    key = _embedding_key(text)
+    cached = await asyncio.to_thread(llm_cache.get, "embedding", key)
+    if cached is not None:
+        return _decode_embedding(cached)
+
+    # Coalesced with other in-flight embedding requests into one list-input call
+    embedding_vector = await llm_gateway.embed(text)
+    await asyncio.to_thread(llm_cache.put, "embedding", key, _encode_embedding(embedding_vector))
+    return embedding_vector
+
+# User questions are only kept in memory: they are not written to disk and cannot evict the
+# summaries and catalog embeddings the persistent cache exists for
+_query_embeddings = OrderedDict()
+
+async def generate_query_embedding(query: str) -> list[float]:
+    cached = _query_embeddings.get(query)
+    if cached is not None:
+        _query_embeddings.move_to_end(query)
+        return cached.tolist()
+
+    embedding_vector = await llm_gateway.embed(query)
+    if QUERY_EMBEDDING_CACHE_SIZE > 0:
+        _query_embeddings[query] = np.asarray(embedding_vector, dtype=np.float32)
+        _query_embeddings.move_to_end(query)
+        while len(_query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+            _query_embeddings.popitem(last=False)
     return embedding_vector
 
+# Embeds many texts; only texts missing from the cache are sent, and the gateway packs them
+# into list-input calls of up to EMBEDDING_BATCH_SIZE texts
+async def generate_embeddings(texts: list[str]) -> list[list[float]]:
+    keys = [_embedding_key(text) for text in texts]
+    cached = await asyncio.to_thread(llm_cache.get_many, "embedding", keys)
+    missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in cached))
+
+    fetched = {}
+    if missing:
+        embeddings = await llm_gateway.embed_many(missing)
+        fetched = {_embedding_key(text): embedding for text, embedding in zip(missing, embeddings)}
+        await asyncio.to_thread(llm_cache.put_many, "embedding",
+                                {key: _encode_embedding(embedding) for key, embedding in fetched.items()})
+
+    return [fetched[key] if key in fetched else _decode_embedding(cached[key]) for key in keys]
+
 # Calculates the cosine similarity between two embedding vectors
 def cosine_similarity(v1, v2):
     v1, v2 = np.array(v1), np.array(v2)
     return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
 
-# Returns the three most relevant books to a user's query
-def get_most_similar(books, query):
-    query_embedding = generate_embedding(query)
-    similarities = []
-    for book in books:
-        sim = cosine_similarity(query_embedding, book.embedding)
-        similarities.append({
-            "isbn": book.isbn,
-            "title": book.title,
-            "authors": book.authors,
-            "similarity": sim
-        })
-
-    similarities.sort(key=lambda x: x["similarity"], reverse=True)
-
-    return similarities[:3]
\ No newline at end of file
+# Returns the k most relevant books to a user's query, ranked by the in-memory index on
+# semantic similarity fused with title/author/genre matches, within the optional filters
+async def get_most_similar(query, k=3, filters=None, query_embedding=None):
+    if query_embedding is None:
+        query_embedding = await generate_query_embedding(query)
+    return await asyncio.to_thread(embedding_index.search, query_embedding, k, query, filters)
\ No newline at end of file
@@ -0,0 +1,216 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.common.constants import SQL_LOG_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# Minimal Prometheus-compatible metrics. Values are kept per process and rendered
+# in the text exposition format by the /metrics route.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [("", dict(zip(self.labelnames, key)), value) for key, value in items]
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labelnames=(), callback=None):
+        super().__init__(name, description, labelnames)
+        self._callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self._callback is not None:
+            return [("", {}, self._callback())]
+        with self._lock:
+            items = list(self._values.items())
+        return [("", dict(zip(self.labelnames, key)), value) for key, value in items]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        samples = []
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append(("_bucket", {**labels, "le": le}, cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, count))
+        return samples
+
+registry = []
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in list(registry) for line in metric.render()) + "\n"
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route, until the last body byte is sent",
+    ("method", "route", "status")
+)
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement execution time", ("operation",))
+POOL_CHECKOUT_SECONDS = Histogram("db_pool_checkout_seconds", "Time spent waiting for a pooled connection")
+UPSTREAM_SECONDS = Histogram(
+    "upstream_request_duration_seconds", "Latency of calls to OpenAI and OpenLibrary", ("service", "operation")
+)
+CHAT_FIRST_TOKEN_SECONDS = Histogram(
+    "chat_time_to_first_token_seconds", "Time from receiving a /chat request to streaming its first token"
+)
+
+def _statement_operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+# Pool events fire only once a connection is handed out, so the wait is timed around connect() itself.
+# Every checkout goes through here (get_db and direct engine.connect() alike), and recreate() after
+# engine.dispose() builds the same class.
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+# Times every statement through engine events and exposes pool usage as gauges.
+# Statements are only logged for a SQL_LOG_SAMPLE_RATE fraction of executions.
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+
+    # The start time lives on the statement's execution context, so a statement that raises leaves nothing behind
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        QUERY_SECONDS.observe(elapsed, operation=_statement_operation(statement))
+        if SQL_LOG_SAMPLE_RATE and random.random() < SQL_LOG_SAMPLE_RATE:
+            logger.info("SQL (%.1f ms): %s", elapsed * 1000, statement)
+
+    # engine.dispose() swaps in a new pool, so the gauges look it up on every read
+    capacity = sync_engine.pool.size() + sync_engine.pool._max_overflow
+    Gauge("db_pool_checked_out", "Connections currently checked out of the pool",
+          callback=lambda: sync_engine.pool.checkedout())
+    Gauge("db_pool_capacity", "Pool size plus max overflow", callback=lambda: capacity)
+    Gauge("db_pool_saturation", "Fraction of pool capacity checked out",
+          callback=lambda: sync_engine.pool.checkedout() / capacity if capacity else 0.0)
+
+# Pure ASGI middleware, so streaming responses are timed until their last chunk
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route.path if route is not None else "unmatched",
+                status=status["code"]
+            )
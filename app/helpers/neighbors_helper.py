@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import numpy as np
+from sqlalchemy import text
+from app.common.constants import (
+    NEIGHBORS_K, NEIGHBORS_CANDIDATES, NEIGHBORS_BLOCK_ROWS, NEIGHBORS_BLOCK_COLS, INSERT_BATCH_SIZE
+)
+from app.helpers.db_helper import engine, build_values
+from app.helpers.index_helper import EmbeddingIndex, embedding_index, ensure_index_loaded, fetch_index_rows
+from app.helpers.cache_helper import response_cache
+
+logger = logging.getLogger(__name__)
+
+# Precomputed "similar books" graph: the NEIGHBORS_K most similar books of every book, stored in
+# book_neighbors. `manage.py rebuild-book-neighbors` computes all lists with blocked matrix
+# multiplication; adds and removes then patch the affected lists from the in-process index.
+# Patching only checks a new book against its NEIGHBORS_CANDIDATES closest books, so a periodic
+# rebuild is what makes the graph exact again.
+
+def _dense(matrix, scales, start, end):
+    return matrix[start:end].astype(np.float32) * scales[start:end, None]
+
+# Top-k cosine neighbors of every row, excluding the row itself. Similarities are computed one
+# (block_rows x block_cols) tile at a time and folded into a running top-k, so memory stays
+# bounded by the tile size however large the catalog is.
+def top_k_neighbors(matrix, scales, k: int, block_rows: int = NEIGHBORS_BLOCK_ROWS,
+                    block_cols: int = NEIGHBORS_BLOCK_COLS) -> tuple[np.ndarray, np.ndarray]:
+    count = len(matrix)
+    k = min(k, count - 1)
+    if k <= 0:
+        return np.empty((count, 0), dtype=np.int64), np.empty((count, 0), dtype=np.float32)
+    indices = np.empty((count, k), dtype=np.int64)
+    similarities = np.empty((count, k), dtype=np.float32)
+    for row_start in range(0, count, block_rows):
+        row_end = min(row_start + block_rows, count)
+        rows = _dense(matrix, scales, row_start, row_end)
+        best_index = np.empty((row_end - row_start, 0), dtype=np.int64)
+        best_similarity = np.empty((row_end - row_start, 0), dtype=np.float32)
+        for col_start in range(0, count, block_cols):
+            col_end = min(col_start + block_cols, count)
+            tile = rows @ _dense(matrix, scales, col_start, col_end).T
+            # A book is not its own neighbor
+            diagonal = np.arange(max(row_start, col_start), min(row_end, col_end))
+            tile[diagonal - row_start, diagonal - col_start] = -np.inf
+            candidate_similarity = np.concatenate([best_similarity, tile], axis=1)
+            candidate_index = np.concatenate(
+                [best_index, np.broadcast_to(np.arange(col_start, col_end), tile.shape)], axis=1
+            )
+            if candidate_similarity.shape[1] > k:
+                top = np.argpartition(-candidate_similarity, k - 1, axis=1)[:, :k]
+                candidate_similarity = np.take_along_axis(candidate_similarity, top, axis=1)
+                candidate_index = np.take_along_axis(candidate_index, top, axis=1)
+            best_similarity, best_index = candidate_similarity, candidate_index
+        order = np.argsort(-best_similarity, axis=1)
+        similarities[row_start:row_end] = np.take_along_axis(best_similarity, order, axis=1)
+        indices[row_start:row_end] = np.take_along_axis(best_index, order, axis=1)
+    return indices, similarities
+
+async def _insert_neighbors(conn, rows: list[dict]):
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        values, params = build_values(rows[start:start + INSERT_BATCH_SIZE], ["isbn", "neighbor_isbn", "similarity"])
+        await conn.execute(
+            text(f'''INSERT INTO book_neighbors (isbn, neighbor_isbn, similarity) VALUES {values}
+                     ON CONFLICT (isbn, neighbor_isbn) DO UPDATE SET similarity = EXCLUDED.similarity'''),
+            params
+        )
+
+# Replaces the neighbor lists of the given books; lists maps isbn -> [(neighbor_isbn, similarity)]
+async def _replace_lists(conn, lists: dict):
+    await conn.execute(text('''DELETE FROM book_neighbors WHERE isbn = ANY(:isbns)'''), {"isbns": list(lists)})
+    await _insert_neighbors(conn, [
+        {"isbn": isbn, "neighbor_isbn": neighbor, "similarity": similarity}
+        for isbn, neighbors in lists.items() for neighbor, similarity in neighbors
+    ])
+
+def _invalidate(isbns):
+    response_cache.invalidate(*(f"neighbors:{isbn}" for isbn in isbns))
+
+# The k nearest indexed books to an indexed book, from the in-process index
+async def _nearest(isbn: str, k: int) -> list[tuple[str, float]]:
+    vector = embedding_index.vector(isbn)
+    if vector is None:
+        return []
+    hits = await asyncio.to_thread(embedding_index.search, vector, k + 1)
+    return [(hit["isbn"], hit["similarity"]) for hit in hits if hit["isbn"] != isbn][:k]
+
+# Recomputes every neighbor list from book_embeddings in one transaction
+async def rebuild_neighbors(conn) -> int:
+    index = EmbeddingIndex()
+    await asyncio.to_thread(index.load, await fetch_index_rows(conn))
+    matrix, scales, isbns, _ = index.arrays()
+    indices, similarities = await asyncio.to_thread(top_k_neighbors, matrix, scales, NEIGHBORS_K)
+    await conn.execute(text('''DELETE FROM book_neighbors'''))
+    await _insert_neighbors(conn, [
+        {"isbn": isbn, "neighbor_isbn": isbns[neighbor], "similarity": float(similarity)}
+        for isbn, row_indices, row_similarities in zip(isbns, indices, similarities)
+        for neighbor, similarity in zip(row_indices, row_similarities)
+    ])
+    await conn.commit()
+    return len(isbns)
+
+# Gives newly indexed books their own lists and inserts them into the lists of close books they
+# now outrank. Best effort: failures are logged and repaired by the next rebuild.
+async def add_book_neighbors(isbns: list[str]):
+    try:
+        await ensure_index_loaded()
+        lists, reverse = {}, {}
+        for isbn in isbns:
+            candidates = await _nearest(isbn, NEIGHBORS_CANDIDATES)
+            if not candidates:
+                continue
+            lists[isbn] = candidates[:NEIGHBORS_K]
+            for neighbor, similarity in candidates:
+                reverse.setdefault(neighbor, []).append((isbn, similarity))
+        for isbn in lists:
+            reverse.pop(isbn, None)
+        if not lists:
+            return
+
+        async with engine.connect() as conn:
+            await _replace_lists(conn, lists)
+            changed = set(lists)
+            if reverse:
+                current = {row.isbn: row for row in await conn.execute(
+                    text('''SELECT isbn, COUNT(*) AS neighbors, MIN(similarity) AS weakest
+                            FROM book_neighbors WHERE isbn = ANY(:isbns) GROUP BY isbn'''),
+                    {"isbns": list(reverse)}
+                )}
+                # Books without a list yet are left to the rebuild rather than given a partial one
+                inserts = [
+                    {"isbn": isbn, "neighbor_isbn": neighbor, "similarity": similarity}
+                    for isbn, entries in reverse.items() if isbn in current
+                    for neighbor, similarity in entries
+                    if current[isbn].neighbors < NEIGHBORS_K or similarity > current[isbn].weakest
+                ]
+                if inserts:
+                    await _insert_neighbors(conn, inserts)
+                    outranked = list({row["isbn"] for row in inserts})
+                    await conn.execute(
+                        text('''DELETE FROM book_neighbors n
+                                USING (SELECT isbn, neighbor_isbn,
+                                              ROW_NUMBER() OVER (PARTITION BY isbn ORDER BY similarity DESC) AS position
+                                       FROM book_neighbors WHERE isbn = ANY(:isbns)) ranked
+                                WHERE n.isbn = ranked.isbn AND n.neighbor_isbn = ranked.neighbor_isbn
+                                  AND ranked.position > :k'''),
+                        {"isbns": outranked, "k": NEIGHBORS_K}
+                    )
+                    changed.update(outranked)
+            await conn.commit()
+        _invalidate(changed)
+    except Exception as e:
+        logger.warning("Updating neighbors for %d added books failed: %s", len(isbns), e)
+
+# Runs in the caller's transaction when a book is deleted; returns the books that lost a neighbor
+async def remove_book_neighbors(db, isbn: str) -> list[str]:
+    await db.execute(text('''DELETE FROM book_neighbors WHERE isbn = :isbn'''), {"isbn": isbn})
+    result = await db.execute(
+        text('''DELETE FROM book_neighbors WHERE neighbor_isbn = :isbn RETURNING isbn'''),
+        {"isbn": isbn}
+    )
+    return [row.isbn for row in result]
+
+# Recomputes the lists of books that lost a neighbor, once the removed book has left the index
+async def refill_book_neighbors(removed_isbn: str, isbns: list[str]):
+    try:
+        if isbns:
+            await ensure_index_loaded()
+            lists = {isbn: await _nearest(isbn, NEIGHBORS_K) for isbn in isbns}
+            async with engine.connect() as conn:
+                await _replace_lists(conn, {isbn: neighbors for isbn, neighbors in lists.items() if neighbors})
+                await conn.commit()
+        _invalidate([removed_isbn, *isbns])
+    except Exception as e:
+        logger.warning("Refilling neighbors after removing %s failed: %s", removed_isbn, e)
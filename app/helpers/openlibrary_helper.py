@@ -0,0 +1,164 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import httpx
+from app.common.constants import (
+    OPENLIBRARY_BASE_URL, OPENLIBRARY_BATCH_SIZE, OPENLIBRARY_MODE, OPENLIBRARY_CACHE_PATH, OPENLIBRARY_REPLAY_PATH,
+    OPENLIBRARY_CACHE_TTL, OPENLIBRARY_NEGATIVE_TTL, OPENLIBRARY_MAX_CONNECTIONS, OPENLIBRARY_TIMEOUT
+)
+from app.helpers.metrics_helper import Counter, UPSTREAM_SECONDS
+
+# Shared OpenLibrary metadata client. One pooled httpx client is reused for every lookup and
+# responses are cached on disk per ISBN, including "not found" answers for a shorter time.
+#
+# OPENLIBRARY_MODE:
+#   live   - serve fresh cache entries, fetch the rest from OPENLIBRARY_BASE_URL
+#   record - like live, and also save every answer to the replay store
+#   replay - answer only from the replay store, never touching the network
+
+SQLITE_BATCH_SIZE = 500
+
+METADATA_LOOKUPS = Counter("openlibrary_lookups_total", "OpenLibrary lookups by source", ("source",))
+
+class OpenLibraryError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+# SQLite file of OpenLibrary answers keyed by ISBN; data is NULL for ISBNs OpenLibrary does not know
+class MetadataStore:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                  isbn TEXT PRIMARY KEY,
+                                  data TEXT,
+                                  fetched_at REAL NOT NULL
+                              )''')
+        self._conn.commit()
+
+    # Returns {isbn: (data or None, fetched_at)} for the ISBNs the store has
+    def get_many(self, isbns: list[str]) -> dict:
+        rows = []
+        with self._lock:
+            for start in range(0, len(isbns), SQLITE_BATCH_SIZE):
+                chunk = isbns[start:start + SQLITE_BATCH_SIZE]
+                rows.extend(self._conn.execute(
+                    f"SELECT isbn, data, fetched_at FROM responses WHERE isbn IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+        return {isbn: (json.loads(data) if data is not None else None, fetched_at) for isbn, data, fetched_at in rows}
+
+    def put_many(self, entries: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO responses (isbn, data, fetched_at) VALUES (?, ?, ?)",
+                [(isbn, json.dumps(data) if data is not None else None, now) for isbn, data in entries.items()]
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class OpenLibraryClient:
+    def __init__(self):
+        self._client = None
+        self._cache = None
+        self._replay = None
+
+    @property
+    def cache(self) -> MetadataStore:
+        if self._cache is None:
+            self._cache = MetadataStore(OPENLIBRARY_CACHE_PATH)
+        return self._cache
+
+    @property
+    def replay(self) -> MetadataStore:
+        if self._replay is None:
+            self._replay = MetadataStore(OPENLIBRARY_REPLAY_PATH)
+        return self._replay
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=OPENLIBRARY_BASE_URL,
+                timeout=OPENLIBRARY_TIMEOUT,
+                limits=httpx.Limits(max_connections=OPENLIBRARY_MAX_CONNECTIONS,
+                                    max_keepalive_connections=OPENLIBRARY_MAX_CONNECTIONS)
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        for store in (self._cache, self._replay):
+            if store is not None:
+                store.close()
+        self._cache = self._replay = None
+
+    async def _fetch(self, isbns: list[str]) -> dict:
+        with UPSTREAM_SECONDS.time(service="openlibrary", operation="books"):
+            try:
+                response = await self.client.get("/api/books", params={
+                    "bibkeys": ",".join(f"ISBN:{isbn}" for isbn in isbns),
+                    "format": "json",
+                    "jscmd": "data"
+                })
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                raise OpenLibraryError(502, f"Upstream HTTP error: {e.response.status_code}")
+            except httpx.RequestError:
+                raise OpenLibraryError(503, "Failed to reach upstream")
+        try:
+            data = response.json()
+        except ValueError:
+            raise OpenLibraryError(502, "Upstream returned invalid JSON")
+        if not isinstance(data, dict):
+            raise OpenLibraryError(502, "Upstream returned an unexpected response")
+        return {isbn: data.get(f"ISBN:{isbn}") or None for isbn in isbns}
+
+    # Looks up ISBNs, packing cache misses into as few bibkeys= requests as possible.
+    # Returns the records that were found and an OpenLibraryError for every ISBN whose request failed;
+    # ISBNs in neither are not known to OpenLibrary.
+    async def lookup(self, isbns: list[str]) -> tuple[dict, dict]:
+        if not isbns:
+            return {}, {}
+        if OPENLIBRARY_MODE == "replay":
+            stored = await asyncio.to_thread(self.replay.get_many, isbns)
+            METADATA_LOOKUPS.inc(len(isbns), source="replay")
+            return {isbn: entry[0] for isbn, entry in stored.items() if entry[0] is not None}, {}
+
+        answers = {}
+        now = time.time()
+        for isbn, (data, fetched_at) in (await asyncio.to_thread(self.cache.get_many, isbns)).items():
+            ttl = OPENLIBRARY_CACHE_TTL if data is not None else OPENLIBRARY_NEGATIVE_TTL
+            if now - fetched_at < ttl:
+                answers[isbn] = data
+        METADATA_LOOKUPS.inc(len(answers), source="cache")
+
+        errors, fetched = {}, {}
+        missing = [isbn for isbn in isbns if isbn not in answers]
+        for start in range(0, len(missing), OPENLIBRARY_BATCH_SIZE):
+            chunk = missing[start:start + OPENLIBRARY_BATCH_SIZE]
+            try:
+                fetched.update(await self._fetch(chunk))
+            except OpenLibraryError as e:
+                errors.update({isbn: e for isbn in chunk})
+        METADATA_LOOKUPS.inc(len(fetched), source="network")
+        if fetched:
+            await asyncio.to_thread(self.cache.put_many, fetched)
+        answers.update(fetched)
+
+        if OPENLIBRARY_MODE == "record" and answers:
+            await asyncio.to_thread(self.replay.put_many, answers)
+        return {isbn: data for isbn, data in answers.items() if data is not None}, errors
+
+openlibrary_client = OpenLibraryClient()
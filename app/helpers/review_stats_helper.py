@@ -0,0 +1,109 @@
+from collections import defaultdict
+from sqlalchemy import text
+from app.helpers.db_helper import build_values
+
+# Review aggregates, kept in book_review_stats and account_review_stats in the same transaction as the
+# review or like write that changes them, so listings, leaderboards and the contest never aggregate reviews.
+# Rows are upserted in key order, so concurrent writers lock them in the same order.
+
+BOOK_STATS_CASTS = {"isbn": "TEXT", "review_count": "BIGINT", "rating_count": "BIGINT",
+                    "rating_sum": "FLOAT8", "like_count": "BIGINT"}
+ACCOUNT_STATS_CASTS = {"account_id": "BIGINT", "review_count": "BIGINT", "likes_received": "BIGINT"}
+
+async def _upsert_book_stats(db, deltas: dict):
+    rows = [{"isbn": isbn, **delta} for isbn, delta in sorted(deltas.items()) if any(delta.values())]
+    if not rows:
+        return
+    values, params = build_values(rows, list(BOOK_STATS_CASTS), casts=BOOK_STATS_CASTS)
+    await db.execute(
+        text(f'''INSERT INTO book_review_stats AS s (isbn, review_count, rating_count, rating_sum, like_count)
+                 SELECT * FROM (VALUES {values}) AS v(isbn, review_count, rating_count, rating_sum, like_count)
+                 ON CONFLICT (isbn) DO UPDATE SET
+                     review_count = s.review_count + EXCLUDED.review_count,
+                     rating_count = s.rating_count + EXCLUDED.rating_count,
+                     rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+                     like_count = s.like_count + EXCLUDED.like_count,
+                     updated_at = NOW()'''),
+        params
+    )
+
+async def _upsert_account_stats(db, deltas: dict):
+    rows = [{"account_id": account_id, **delta} for account_id, delta in sorted(deltas.items()) if any(delta.values())]
+    if not rows:
+        return
+    values, params = build_values(rows, list(ACCOUNT_STATS_CASTS), casts=ACCOUNT_STATS_CASTS)
+    await db.execute(
+        text(f'''INSERT INTO account_review_stats AS s (account_id, review_count, likes_received)
+                 SELECT * FROM (VALUES {values}) AS v(account_id, review_count, likes_received)
+                 ON CONFLICT (account_id) DO UPDATE SET
+                     review_count = s.review_count + EXCLUDED.review_count,
+                     likes_received = s.likes_received + EXCLUDED.likes_received,
+                     updated_at = NOW()'''),
+        params
+    )
+
+# Reviews that were written (sign=1) or deleted (sign=-1); rows need account_id, book_isbn, rating and likes
+async def apply_review_changes(db, reviews, sign: int):
+    books = defaultdict(lambda: {"review_count": 0, "rating_count": 0, "rating_sum": 0.0, "like_count": 0})
+    accounts = defaultdict(lambda: {"review_count": 0, "likes_received": 0})
+    for review in reviews:
+        book = books[review["book_isbn"]]
+        book["review_count"] += sign
+        if review["rating"] is not None:
+            book["rating_count"] += sign
+            book["rating_sum"] += sign * float(review["rating"])
+        book["like_count"] += sign * (review["likes"] or 0)
+        account = accounts[review["account_id"]]
+        account["review_count"] += sign
+        account["likes_received"] += sign * (review["likes"] or 0)
+    await _upsert_book_stats(db, books)
+    await _upsert_account_stats(db, accounts)
+
+# Like count changes of existing reviews; rows need account_id (the review author), book_isbn and delta
+async def apply_like_changes(db, changes):
+    books = defaultdict(lambda: {"review_count": 0, "rating_count": 0, "rating_sum": 0.0, "like_count": 0})
+    accounts = defaultdict(lambda: {"review_count": 0, "likes_received": 0})
+    for change in changes:
+        books[change["book_isbn"]]["like_count"] += change["delta"]
+        accounts[change["account_id"]]["likes_received"] += change["delta"]
+    await _upsert_book_stats(db, books)
+    await _upsert_account_stats(db, accounts)
+
+# Recomputes both tables from reviews. Review writes wait on the table lock until this commits,
+# so no change is lost or counted twice.
+async def rebuild_review_stats(conn) -> tuple[int, int]:
+    await conn.execute(text('''LOCK TABLE reviews IN SHARE MODE'''))
+    await conn.execute(text('''DELETE FROM book_review_stats'''))
+    await conn.execute(text('''DELETE FROM account_review_stats'''))
+    books = await conn.execute(
+        text('''INSERT INTO book_review_stats (isbn, review_count, rating_count, rating_sum, like_count)
+                SELECT book_isbn, COUNT(*), COUNT(rating), COALESCE(SUM(rating), 0), COALESCE(SUM(likes), 0)
+                FROM reviews WHERE book_isbn IS NOT NULL GROUP BY book_isbn''')
+    )
+    accounts = await conn.execute(
+        text('''INSERT INTO account_review_stats (account_id, review_count, likes_received)
+                SELECT account_id, COUNT(*), COALESCE(SUM(likes), 0)
+                FROM reviews WHERE account_id IS NOT NULL GROUP BY account_id''')
+    )
+    await conn.commit()
+    return books.rowcount, accounts.rowcount
+
+# Leaderboards read only the stats tables (and books/accounts for display), through the indexes on their sort keys
+LEADERBOARDS = {
+    "top_rated": '''SELECT b.isbn, b.title, b.authors, b.image, s.average_rating, s.rating_count, s.review_count
+                    FROM book_review_stats s JOIN books b ON b.isbn = s.isbn
+                    WHERE s.rating_count >= :min_ratings
+                    ORDER BY s.average_rating DESC NULLS LAST, s.isbn LIMIT :limit''',
+    "most_reviewed": '''SELECT b.isbn, b.title, b.authors, b.image, s.review_count, s.average_rating, s.like_count
+                        FROM book_review_stats s JOIN books b ON b.isbn = s.isbn
+                        WHERE s.review_count > 0
+                        ORDER BY s.review_count DESC, s.isbn LIMIT :limit''',
+    "top_reviewers": '''SELECT a.account_id, a.username, s.review_count, s.likes_received
+                        FROM account_review_stats s JOIN accounts a ON a.account_id = s.account_id
+                        WHERE s.review_count > 0
+                        ORDER BY s.review_count DESC, s.account_id LIMIT :limit''',
+    "most_liked_reviewers": '''SELECT a.account_id, a.username, s.likes_received, s.review_count
+                               FROM account_review_stats s JOIN accounts a ON a.account_id = s.account_id
+                               WHERE s.likes_received > 0
+                               ORDER BY s.likes_received DESC, s.account_id LIMIT :limit''',
+}
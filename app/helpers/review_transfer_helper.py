@@ -0,0 +1,255 @@
+import asyncio
+import codecs
+import csv
+import json
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import text
+from app.common.constants import (
+    REVIEW_IMPORT_CHUNK_SIZE, REVIEW_IMPORT_MAX_ERRORS, REVIEW_EXPORT_CHUNK_BYTES, REVIEW_EXPORT_QUEUE_SIZE
+)
+from app.helpers.db_helper import engine
+from app.helpers.reviews_helper import REVIEW_KEYS, parse_review_sections
+from app.helpers.review_stats_helper import apply_review_changes
+from app.helpers.contest_helper import review_sampler
+from app.helpers.cache_helper import response_cache
+
+logger = logging.getLogger(__name__)
+
+# Bulk review import and export over COPY.
+#
+# Import reads NDJSON or CSV records (account_id, book_isbn, rating, review_text and optionally review_date)
+# as a stream and works in chunks of REVIEW_IMPORT_CHUNK_SIZE. Each chunk is validated and parsed into
+# sections, then COPY'd into a temporary staging table. One INSERT ... SELECT moves the rows whose book
+# and account exist, and the chunk commits together with its review stats. Failures are reported per input
+# line; a chunk that fails as a whole reports each of its lines.
+#
+# Export runs COPY ... TO STDOUT on its own connection and hands fixed-size chunks through a bounded
+# queue, so memory stays constant however many rows are exported.
+
+IMPORT_FORMATS = ("ndjson", "csv")
+STAGING_COLUMNS = ["line", "account_id", "book_isbn", "rating", "review_text", "sections", "review_date"]
+
+class ImportSummary:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < REVIEW_IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self) -> dict:
+        return {"imported": self.imported, "failed": self.failed, "errors": self.errors,
+                "errors_truncated": self.failed > len(self.errors)}
+
+# Decodes a byte stream into (line number, line) pairs without holding more than one line
+async def read_lines(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending, number = "", 0
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            number += 1
+            yield number, line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield number + 1, pending.rstrip("\r")
+
+# Yields (line number, record or None, error or None). CSV needs a header row; quoted fields may span lines.
+async def read_records(lines, source_format: str):
+    if source_format == "ndjson":
+        async for number, line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield number, None, "Invalid JSON"
+                continue
+            yield (number, record, None) if isinstance(record, dict) else (number, None, "Expected a JSON object")
+        return
+
+    header, buffer, start = None, "", 0
+    async for number, line in lines:
+        if not buffer:
+            start = number
+        buffer = f"{buffer}\n{line}" if buffer else line
+        # An odd number of quotes means a quoted field continues on the next line
+        if buffer.count('"') % 2:
+            continue
+        row, buffer = next(csv.reader([buffer]), []), ""
+        if not any(field.strip() for field in row):
+            continue
+        if header is None:
+            header = [field.strip() for field in row]
+        elif len(row) != len(header):
+            yield start, None, f"Expected {len(header)} fields, got {len(row)}"
+        else:
+            yield start, dict(zip(header, row)), None
+    if buffer:
+        yield start, None, "Unterminated quoted field"
+
+def _optional(value):
+    return None if value is None or (isinstance(value, str) and not value.strip()) else value
+
+# Returns the staging row for a record, or raises ValueError with the reason it cannot be imported
+def validate_record(line: int, record: dict, require_sections: bool) -> tuple:
+    try:
+        account_id = int(record.get("account_id"))
+    except (TypeError, ValueError):
+        raise ValueError("account_id must be an integer")
+    book_isbn = str(record.get("book_isbn") or "").strip()
+    if not book_isbn:
+        raise ValueError("book_isbn is required")
+    rating = _optional(record.get("rating"))
+    if rating is not None:
+        try:
+            rating = int(rating)
+        except (TypeError, ValueError):
+            raise ValueError("rating must be an integer")
+        if not 1 <= rating <= 5:
+            raise ValueError("rating must be between 1 and 5")
+    review_text = record.get("review_text")
+    if not isinstance(review_text, str) or not review_text.strip():
+        raise ValueError("review_text is required")
+    sections = parse_review_sections(review_text)
+    if require_sections and not any(sections.values()):
+        raise ValueError(f"review_text has none of the sections {', '.join(REVIEW_KEYS)}")
+    review_date = _optional(record.get("review_date"))
+    if review_date is not None:
+        try:
+            review_date = datetime.fromisoformat(str(review_date))
+        except ValueError:
+            raise ValueError("review_date must be an ISO 8601 timestamp")
+        if review_date.tzinfo is None:
+            review_date = review_date.replace(tzinfo=timezone.utc)
+    return (line, account_id, book_isbn, rating, review_text, json.dumps(sections), review_date)
+
+async def _import_chunk(rows: list[tuple], summary: ImportSummary) -> list:
+    async with engine.connect() as conn:
+        await conn.execute(text('''CREATE TEMP TABLE IF NOT EXISTS review_import (
+                                       line BIGINT, account_id BIGINT, book_isbn TEXT, rating INTEGER,
+                                       review_text TEXT, sections JSONB, review_date TIMESTAMPTZ
+                                   ) ON COMMIT DELETE ROWS'''))
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table("review_import", records=rows, columns=STAGING_COLUMNS)
+        unknown = await conn.execute(text('''SELECT s.line, b.isbn IS NULL AS unknown_book, a.account_id IS NULL AS unknown_account
+                                             FROM review_import s
+                                             LEFT JOIN books b ON b.isbn = s.book_isbn
+                                             LEFT JOIN accounts a ON a.account_id = s.account_id
+                                             WHERE b.isbn IS NULL OR a.account_id IS NULL'''))
+        rejected = [(row.line, "Unknown book" if row.unknown_book else "Unknown account") for row in unknown]
+        inserted = (await conn.execute(text('''INSERT INTO reviews (account_id, review_text, rating, review_date, book_isbn, sections)
+                                               SELECT s.account_id, s.review_text, s.rating, COALESCE(s.review_date, NOW()),
+                                                      s.book_isbn, s.sections
+                                               FROM review_import s
+                                               WHERE EXISTS (SELECT 1 FROM books b WHERE b.isbn = s.book_isbn)
+                                                 AND EXISTS (SELECT 1 FROM accounts a WHERE a.account_id = s.account_id)
+                                               ORDER BY s.line
+                                               RETURNING account_id, book_isbn, rating, likes'''))).mappings().all()
+        await apply_review_changes(conn, inserted, 1)
+        await conn.commit()
+    for line, message in sorted(rejected):
+        summary.error(line, message)
+    summary.imported += len(inserted)
+    return inserted
+
+def _publish(inserted: list):
+    accounts = {}
+    for row in inserted:
+        accounts[row["account_id"]] = accounts.get(row["account_id"], 0) + 1
+    for account_id, count in accounts.items():
+        review_sampler.update(account_id, count)
+    response_cache.invalidate(*{f"reviews:{row['book_isbn']}" for row in inserted}, "review_stats")
+
+# Imports a stream of raw bytes in the given format and returns the summary
+async def import_reviews(chunks, source_format: str, require_sections: bool = False) -> dict:
+    summary = ImportSummary()
+    rows = []
+
+    async def flush():
+        try:
+            _publish(await _import_chunk(rows, summary))
+        except Exception as e:
+            logger.warning("Importing %d reviews failed: %s", len(rows), e)
+            for row in rows:
+                summary.error(row[0], f"Chunk failed: {str(e)}")
+        rows.clear()
+
+    async for line, record, error in read_records(read_lines(chunks), source_format):
+        if error is None:
+            try:
+                rows.append(validate_record(line, record, require_sections))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            summary.error(line, error)
+        if len(rows) >= REVIEW_IMPORT_CHUNK_SIZE:
+            await flush()
+    if rows:
+        await flush()
+    return summary.as_dict()
+
+EXPORT_QUERIES = {
+    "reviews": '''SELECT review_id, account_id, book_isbn, rating, review_date, likes, review_text, sections
+                  FROM reviews ORDER BY review_id''',
+    "likes": '''SELECT review_id, account_id, isbn FROM review_likes ORDER BY review_id, account_id''',
+}
+
+# COPY options for an export. NDJSON rows come out of row_to_json, which escapes every control character,
+# so CSV mode with control characters as quote and delimiter passes them through unquoted.
+def export_copy(kind: str, target_format: str) -> tuple[str, dict]:
+    query = EXPORT_QUERIES[kind]
+    if target_format == "csv":
+        return query, {"format": "csv", "header": True}
+    return f"SELECT row_to_json(t)::text FROM ({query}) t", {"format": "csv", "quote": "\x01", "delimiter": "\x02"}
+
+# Streams an export as chunks of about REVIEW_EXPORT_CHUNK_BYTES; the bounded queue holds COPY back
+# while the client is slower than the database
+async def stream_export(kind: str, target_format: str):
+    query, options = export_copy(kind, target_format)
+    queue = asyncio.Queue(maxsize=REVIEW_EXPORT_QUEUE_SIZE)
+    buffer = bytearray()
+
+    async def write(data):
+        buffer.extend(data)
+        if len(buffer) >= REVIEW_EXPORT_CHUNK_BYTES:
+            await queue.put(bytes(buffer))
+            buffer.clear()
+
+    async def produce():
+        try:
+            async with engine.connect() as conn:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_from_query(query, output=write, **options)
+        except Exception as e:
+            await queue.put(e)
+            return
+        if buffer:
+            await queue.put(bytes(buffer))
+        await queue.put(None)
+
+    task = asyncio.create_task(produce())
+    try:
+        while (chunk := await queue.get()) is not None:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # The client went away (or the export failed): stop COPY and return the connection
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+async def export_to_file(kind: str, target_format: str, path: str):
+    query, options = export_copy(kind, target_format)
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_from_query(query, output=path, **options)
@@ -1,19 +1,43 @@
 import re
+from datetime import datetime
+from fastapi import HTTPException
 
-# This method 
+# Reviews are written as "%OverallThoughts% ... %FavoriteCharacter% ... %FavoritePart% ...".
+# The pattern is compiled once; sections are parsed when a review is written and stored with it.
 
-def process_reviews(reviews):
-    keys = ["OverallThoughts", "FavoriteCharacter", "FavoritePart"]
+REVIEW_KEYS = ["OverallThoughts", "FavoriteCharacter", "FavoritePart"]
+_CANONICAL_KEYS = {key.lower(): key for key in REVIEW_KEYS}
+_KEY_GROUP = "|".join(REVIEW_KEYS)
+REVIEW_SECTION_PATTERN = re.compile(
+    r"%(" + _KEY_GROUP + r")%(.*?)(?=%(?:" + _KEY_GROUP + r")%|$)",
+    flags=re.DOTALL | re.IGNORECASE
+)
+
+def parse_review_sections(review_text: str | None) -> dict:
+    mapping = {key: "" for key in REVIEW_KEYS}
+    for key, content in REVIEW_SECTION_PATTERN.findall(review_text or ""):
+        mapping[_CANONICAL_KEYS[key.lower()]] = content.strip()
+    return mapping
 
+# Replaces each review's raw text with its sections, using the stored sections when the row has them
+def process_reviews(reviews):
     for review in reviews:
-        reviewText = review["review_text"]
-        pattern = r"%(" + "|".join(keys) + r")%(.*?)(?=%(" + "|".join(keys) + r")%|$)"
-        
-        matches = re.findall(pattern, reviewText, flags=re.DOTALL | re.IGNORECASE)
+        sections = review.pop("sections", None)
+        review["review_text"] = sections if sections is not None else parse_review_sections(review["review_text"])
+
+# Keyset cursors for paging a book's reviews: "<sort value>|<review_id>"
+REVIEW_SORTS = {
+    "recent": ("r.review_date", "review_date"),
+    "liked": ("r.likes", "likes")
+}
 
-        mapping = {key: "" for key in keys}
+def encode_review_cursor(review: dict, sort: str) -> str:
+    value = review[REVIEW_SORTS[sort][1]]
+    return f"{value.isoformat() if sort == 'recent' else value}|{review['review_id']}"
 
-        for key, content, _ in matches:
-            mapping[key] = content.strip()
-        
-        review["review_text"] = mapping
\ No newline at end of file
+def decode_review_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        value, review_id = cursor.rsplit("|", 1)
+        return (datetime.fromisoformat(value) if sort == "recent" else int(value)), int(review_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
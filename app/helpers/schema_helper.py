@@ -0,0 +1,95 @@
+from sqlalchemy import text
+
+# Tables and indexes owned by the API itself. Every statement is idempotent and runs at startup.
+SCHEMA_STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS enrichment_jobs (
+           isbn TEXT PRIMARY KEY,
+           status TEXT NOT NULL DEFAULT 'pending',
+           attempts INTEGER NOT NULL DEFAULT 0,
+           next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+           last_error TEXT,
+           created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+           updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+       )''',
+    '''CREATE INDEX IF NOT EXISTS enrichment_jobs_due_idx
+           ON enrichment_jobs (next_attempt_at) WHERE status IN ('pending', 'running')''',
+    '''ALTER TABLE reviews ADD COLUMN IF NOT EXISTS sections JSONB''',
+    '''CREATE INDEX IF NOT EXISTS reviews_book_recent_idx ON reviews (book_isbn, review_date DESC, review_id DESC)''',
+    '''CREATE INDEX IF NOT EXISTS reviews_book_liked_idx ON reviews (book_isbn, likes DESC, review_id DESC)''',
+    # One-time cleanup before likes are upserted: drop duplicate likes, resync counters, then enforce uniqueness
+    '''DO $$
+       BEGIN
+           IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'review_likes_review_account_idx') THEN
+               DELETE FROM review_likes a USING review_likes b
+                   WHERE a.ctid < b.ctid AND a.review_id = b.review_id AND a.account_id = b.account_id;
+               UPDATE reviews r SET likes = (SELECT COUNT(*) FROM review_likes l WHERE l.review_id = r.review_id);
+               CREATE UNIQUE INDEX review_likes_review_account_idx ON review_likes (review_id, account_id);
+           END IF;
+       END $$''',
+    # Compact embedding formats (EMBEDDING_STORAGE) are stored as blobs instead of float[]
+    '''ALTER TABLE book_embeddings ADD COLUMN IF NOT EXISTS embedding_blob BYTEA''',
+    '''ALTER TABLE book_embeddings ALTER COLUMN embedding DROP NOT NULL''',
+    # One-time cleanup before wishlist writes become idempotent: drop duplicate rows, then enforce uniqueness
+    '''DO $$
+       BEGIN
+           IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'wishlist_account_isbn_idx') THEN
+               DELETE FROM wishlist a USING wishlist b
+                   WHERE a.ctid < b.ctid AND a.account_id = b.account_id AND a.isbn = b.isbn;
+               CREATE UNIQUE INDEX wishlist_account_isbn_idx ON wishlist (account_id, isbn);
+           END IF;
+       END $$''',
+    # Hydrated wishlists are paged newest first; rows that predate the column share the migration time
+    '''ALTER TABLE wishlist ADD COLUMN IF NOT EXISTS added_at TIMESTAMPTZ NOT NULL DEFAULT NOW()''',
+    '''CREATE INDEX IF NOT EXISTS wishlist_account_added_idx ON wishlist (account_id, added_at DESC, isbn DESC)''',
+    # Precomputed nearest neighbors per book, see neighbors_helper
+    '''CREATE TABLE IF NOT EXISTS book_neighbors (
+           isbn TEXT NOT NULL,
+           neighbor_isbn TEXT NOT NULL,
+           similarity REAL NOT NULL,
+           PRIMARY KEY (isbn, neighbor_isbn)
+       )''',
+    '''CREATE INDEX IF NOT EXISTS book_neighbors_neighbor_idx ON book_neighbors (neighbor_isbn)''',
+    # Review aggregates (see review_stats_helper). Each table is created and backfilled from reviews
+    # in one step, so reviews written before it existed are counted exactly once.
+    '''DO $$
+       BEGIN
+           IF to_regclass('book_review_stats') IS NULL THEN
+               CREATE TABLE book_review_stats (
+                   isbn TEXT PRIMARY KEY,
+                   review_count BIGINT NOT NULL DEFAULT 0,
+                   rating_count BIGINT NOT NULL DEFAULT 0,
+                   rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+                   like_count BIGINT NOT NULL DEFAULT 0,
+                   average_rating DOUBLE PRECISION GENERATED ALWAYS AS (rating_sum / NULLIF(rating_count, 0)) STORED,
+                   updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+               );
+               INSERT INTO book_review_stats (isbn, review_count, rating_count, rating_sum, like_count)
+                   SELECT book_isbn, COUNT(*), COUNT(rating), COALESCE(SUM(rating), 0), COALESCE(SUM(likes), 0)
+                   FROM reviews WHERE book_isbn IS NOT NULL GROUP BY book_isbn;
+           END IF;
+           IF to_regclass('account_review_stats') IS NULL THEN
+               CREATE TABLE account_review_stats (
+                   account_id BIGINT PRIMARY KEY,
+                   review_count BIGINT NOT NULL DEFAULT 0,
+                   likes_received BIGINT NOT NULL DEFAULT 0,
+                   updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+               );
+               INSERT INTO account_review_stats (account_id, review_count, likes_received)
+                   SELECT account_id, COUNT(*), COALESCE(SUM(likes), 0)
+                   FROM reviews WHERE account_id IS NOT NULL GROUP BY account_id;
+           END IF;
+       END $$''',
+    '''CREATE INDEX IF NOT EXISTS book_review_stats_rating_idx ON book_review_stats (average_rating DESC NULLS LAST, isbn)''',
+    '''CREATE INDEX IF NOT EXISTS book_review_stats_count_idx ON book_review_stats (review_count DESC, isbn)''',
+    '''CREATE INDEX IF NOT EXISTS account_review_stats_count_idx ON account_review_stats (review_count DESC, account_id)''',
+    '''CREATE INDEX IF NOT EXISTS account_review_stats_likes_idx ON account_review_stats (likes_received DESC, account_id)''',
+]
+
+# Serializes schema changes across workers starting at the same time
+SCHEMA_LOCK_ID = 7306140
+
+async def apply_schema(conn):
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": SCHEMA_LOCK_ID})
+    for statement in SCHEMA_STATEMENTS:
+        await conn.execute(text(statement))
+    await conn.commit()
@@ -0,0 +1,109 @@
+import math
+import re
+
+# Lexical side of /chat retrieval: an inverted index over title, author and genre tokens and the
+# structured filters (genre, page range, publication year) applied before vector scoring.
+# Lexical scores are idf-weighted and normalized to [0, 1] so they can be fused with cosine similarity.
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+YEAR_PATTERN = re.compile(r"\b(1[0-9]{3}|20[0-9]{2})\b")
+FIELD_WEIGHTS = {"title": 1.0, "authors": 1.0, "genres": 0.5}
+STOPWORDS = frozenset("""
+    a about an and any are as at be book books by can do does for from have i in is it me my
+    novel novels of on or read recommend some something that the this to want what which who with written you
+""".split())
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def publication_year(publication_date: str | None) -> int | None:
+    match = YEAR_PATTERN.search(publication_date or "")
+    return int(match.group(1)) if match else None
+
+class SearchFilters:
+    __slots__ = ("genre", "min_pages", "max_pages", "min_year", "max_year")
+
+    def __init__(self, genre=None, min_pages=None, max_pages=None, min_year=None, max_year=None):
+        self.genre = genre
+        self.min_pages = min_pages
+        self.max_pages = max_pages
+        self.min_year = min_year
+        self.max_year = max_year
+
+    def __bool__(self):
+        return any(getattr(self, name) is not None for name in self.__slots__)
+
+class LexicalIndex:
+    def __init__(self):
+        self._postings = {}
+        self._genres = {}
+        self._tokens = {}
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def clear(self):
+        self._postings.clear()
+        self._genres.clear()
+        self._tokens.clear()
+
+    # book is the index's metadata dict: title, authors and genres
+    def add(self, isbn: str, book: dict):
+        self.remove(isbn)
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = book.get(field)
+            text = " ".join(value) if isinstance(value, list) else value
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0.0), weight)
+        # Each genre keeps its own token set, so a filter has to match within one genre
+        genre_phrases = tuple({frozenset(tokenize(genre)) for genre in book.get("genres") or []} - {frozenset()})
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[isbn] = weight
+        for token in frozenset().union(*genre_phrases):
+            self._genres.setdefault(token, set()).add(isbn)
+        self._tokens[isbn] = (tuple(weights), genre_phrases)
+
+    def remove(self, isbn: str):
+        tokens = self._tokens.pop(isbn, None)
+        if tokens is None:
+            return
+        weighted_tokens, genre_phrases = tokens
+        for token in weighted_tokens:
+            postings = self._postings[token]
+            del postings[isbn]
+            if not postings:
+                del self._postings[token]
+        for token in frozenset().union(*genre_phrases):
+            isbns = self._genres[token]
+            isbns.discard(isbn)
+            if not isbns:
+                del self._genres[token]
+
+    # ISBNs with a single genre containing every token of `genre`
+    def genre_matches(self, genre: str) -> set:
+        tokens = frozenset(tokenize(genre))
+        if not tokens:
+            return set()
+        matches = [self._genres.get(token, set()) for token in tokens]
+        candidates = set.intersection(*sorted(matches, key=len))
+        if len(tokens) == 1:
+            return candidates
+        return {isbn for isbn in candidates if any(tokens <= phrase for phrase in self._tokens[isbn][1])}
+
+    # Returns {isbn: score} for books sharing a token with the query. Query tokens that no book
+    # has (conversational words) are ignored, so a query naming an author or title scores near 1.
+    def score(self, query: str) -> dict:
+        total = len(self._tokens)
+        scores, norm = {}, 0.0
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            norm += idf
+            for isbn, weight in postings.items():
+                scores[isbn] = scores.get(isbn, 0.0) + idf * weight
+        return {isbn: score / norm for isbn, score in scores.items()} if norm else {}
@@ -0,0 +1,147 @@
+import fcntl
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import numpy as np
+from app.helpers.embedding_helper import STORAGE_FORMATS, STORAGE_DTYPES
+
+# Versioned, memory-mapped embedding snapshots shared by every worker process. A snapshot file is
+# written once and never modified; CURRENT names the live one and is swapped with os.replace, so
+# readers never see a partial file. Workers map snapshots read-only, so N workers share one copy
+# of the matrix in the page cache. File layout:
+#   header (64 bytes) | matrix (count x dimensions, storage dtype) | scales (count float32) | metadata JSON
+# Rows are in metadata order: row i belongs to metadata["isbns"][i].
+
+MAGIC = b"BKEMBSNP"
+HEADER = struct.Struct("<8sB3xIQQQQ")
+HEADER_SIZE = 64
+ALIGNMENT = 64
+SNAPSHOT_PATTERN = re.compile(r"^snapshot-(\d+)\.bin$")
+WRITE_BLOCK_ROWS = 4096
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def snapshot_name(version: int) -> str:
+    return f"snapshot-{version:012d}.bin"
+
+def snapshot_version(name: str) -> int:
+    match = SNAPSHOT_PATTERN.match(name)
+    return int(match.group(1)) if match else 0
+
+class EmbeddingSnapshot:
+    def __init__(self, name, storage, dimensions, matrix, scales, isbns, books):
+        self.name = name
+        self.storage = storage
+        self.dimensions = dimensions
+        self.matrix = matrix
+        self.scales = scales
+        self.isbns = isbns
+        self.books = books
+
+    @property
+    def version(self) -> int:
+        return snapshot_version(self.name)
+
+def read_current(directory: str) -> str | None:
+    try:
+        with open(os.path.join(directory, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+# Maps a snapshot read-only; the arrays stay valid even after the file is replaced and unlinked
+def open_snapshot(directory: str, name: str) -> EmbeddingSnapshot:
+    with open(os.path.join(directory, name), "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, storage_code, dimensions, count, scales_offset, meta_offset, meta_length = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f"{name} is not an embedding snapshot")
+    storage = STORAGE_FORMATS[storage_code]
+    matrix = np.frombuffer(buffer, dtype=STORAGE_DTYPES[storage], count=count * dimensions, offset=HEADER_SIZE)
+    scales = np.frombuffer(buffer, dtype=np.float32, count=count, offset=scales_offset)
+    metadata = json.loads(buffer[meta_offset:meta_offset + meta_length])
+    return EmbeddingSnapshot(name, storage, dimensions, matrix.reshape(count, dimensions), scales,
+                             metadata["isbns"], metadata["books"])
+
+# Writes a new snapshot from parts of (matrix, scales, isbns, books), fsyncs it and makes it CURRENT.
+# Matrices are written in blocks, so building from a mapped snapshot never copies it whole.
+# Every non-empty part must be exactly `dimensions` wide.
+def write_snapshot(directory: str, version: int, storage: str, dimensions: int, parts: list) -> str:
+    dtype = np.dtype(STORAGE_DTYPES[storage])
+    count = sum(len(part[2]) for part in parts)
+    widths = {part[0].shape[1] for part in parts if len(part[2])}
+    if widths - {dimensions}:
+        raise ValueError(f"Embedding dimensions {sorted(widths)} do not match snapshot dimension {dimensions}")
+    scales_offset = _aligned(HEADER_SIZE + count * dimensions * dtype.itemsize)
+    meta_offset = _aligned(scales_offset + count * 4)
+    metadata = json.dumps({
+        "isbns": [isbn for part in parts for isbn in part[2]],
+        "books": [book for part in parts for book in part[3]]
+    }).encode()
+
+    name = snapshot_name(version)
+    path = os.path.join(directory, name)
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, STORAGE_FORMATS.index(storage), dimensions, count,
+                            scales_offset, meta_offset, len(metadata)).ljust(HEADER_SIZE, b"\0"))
+        for matrix, _, _, _ in parts:
+            for start in range(0, len(matrix), WRITE_BLOCK_ROWS):
+                f.write(np.ascontiguousarray(matrix[start:start + WRITE_BLOCK_ROWS], dtype=dtype).tobytes())
+        f.write(b"\0" * (scales_offset - f.tell()))
+        for _, scales, _, _ in parts:
+            f.write(np.asarray(scales, dtype=np.float32).tobytes())
+        f.write(b"\0" * (meta_offset - f.tell()))
+        f.write(metadata)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+    with open(os.path.join(directory, "CURRENT.tmp"), "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(os.path.join(directory, "CURRENT.tmp"), os.path.join(directory, "CURRENT"))
+    return name
+
+# Unlinks all but the newest `keep` snapshots; workers still mapping an old one keep their pages
+def prune_snapshots(directory: str, keep: int):
+    versions = sorted((snapshot_version(name), name) for name in os.listdir(directory) if SNAPSHOT_PATTERN.match(name))
+    for _, name in versions[:-keep] if keep > 0 else versions:
+        try:
+            os.unlink(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+# Serializes snapshot writers: a thread lock within the process and flock across processes
+class SnapshotLock:
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, "LOCK")
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            self._fd = fd
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
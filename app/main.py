@@ -2,14 +2,34 @@ from fastapi import FastAPI
 from app.common.constants import DATABASE_URL
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.helpers.db_helper import engine
+from app.helpers.schema_helper import apply_schema
+from app.helpers.enrichment_helper import enrichment_worker
+from app.helpers.likes_helper import like_buffer
+from app.helpers.metrics_helper import MetricsMiddleware, render_metrics
+from app.helpers.account_helper import start_hash_executor, shutdown_hash_executor
+from app.helpers.openlibrary_helper import openlibrary_client
+from app.helpers.llm_cache_helper import llm_cache
+from app.helpers.llm_gateway_helper import llm_gateway
 
 from app.routes import accounts, books, reviews, chat
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    async with engine.connect() as conn:
+        await apply_schema(conn)
+    start_hash_executor()
+    enrichment_worker.start()
+    like_buffer.start()
     yield
-    engine.dispose()
+    await like_buffer.stop()
+    await enrichment_worker.stop()
+    shutdown_hash_executor()
+    await openlibrary_client.close()
+    await llm_gateway.close()
+    llm_cache.close()
+    await engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -21,6 +41,8 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(accounts.router)
 app.include_router(books.router)
 app.include_router(reviews.router)
@@ -28,4 +50,8 @@ app.include_router(chat.router)
 
 @app.get("/")
 def root():
-    return {"message": "Hello, World!"}
\ No newline at end of file
+    return {"message": "Hello, World!"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
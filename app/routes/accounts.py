@@ -1,57 +1,71 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy import text
-from app.helpers.db_helper import get_db
+from app.helpers.db_helper import engine
 from app.common.models import AccountCreate
-from app.helpers.account_helper import get_password_hash, verify_login
+from app.helpers.account_helper import hash_password, verify_login, create_session_token, get_current_account
 
 router = APIRouter()
 
+def login_response(username: str, account_id: int, is_admin: bool) -> dict:
+    return {"message": "Login successful", "username": username, "account_id": account_id, "is_admin": is_admin,
+            "token": create_session_token(account_id, username, is_admin)}
+
+# Argon2 runs between short-lived connections, so a slow hash never holds a pooled connection
 @router.post("/create_account")
-def create_account(account: AccountCreate, db=Depends(get_db)):
+async def create_account(account: AccountCreate):
     try:
-        user_exists = db.execute(
-            text("SELECT 1 FROM accounts WHERE username=:username"),
-            {"username": account.username}
-        ).first()
+        async with engine.connect() as db:
+            user_exists = (await db.execute(
+                text("SELECT 1 FROM accounts WHERE username=:username"),
+                {"username": account.username}
+            )).first()
         if user_exists:
             return {"error": "Username or already exists"}
 
-        hashed_password = get_password_hash(account.password)
-        db.execute(
-            text('''INSERT INTO accounts (username, password_hash, email, account_created, last_login, is_admin)
-                    VALUES (:username, :passwordhash, :email, NOW(), NOW(), FALSE)'''),
-            {"username": account.username, "passwordhash": hashed_password, "email": account.email}
-        )
-        db.commit()
-        return login(account, db)
+        hashed_password = await hash_password(account.password)
+        async with engine.connect() as db:
+            created = (await db.execute(
+                text('''INSERT INTO accounts (username, password_hash, email, account_created, last_login, is_admin)
+                        VALUES (:username, :passwordhash, :email, NOW(), NOW(), FALSE)
+                        RETURNING account_id, is_admin'''),
+                {"username": account.username, "passwordhash": hashed_password, "email": account.email}
+            )).mappings().first()
+            await db.commit()
+        # The password was just hashed, so there is nothing to verify before issuing the session
+        return login_response(account.username, created["account_id"], created["is_admin"])
     except Exception as e:
-        db.rollback()
         return {"error": f"Account creation failed: {str(e)}"}
 
 @router.post("/login")
-def login(account: AccountCreate, db=Depends(get_db)):
+async def login(account: AccountCreate):
     try:
-        existing_account = db.execute(
-            text("SELECT * FROM accounts WHERE username=:username"),
-            {"username": account.username}
-        ).mappings().first()
+        async with engine.connect() as db:
+            existing_account = (await db.execute(
+                text("SELECT account_id, password_hash, is_admin FROM accounts WHERE username=:username"),
+                {"username": account.username}
+            )).mappings().first()
 
         if not existing_account:
             return {"error": "Account does not exist"}
 
-        if not verify_login(account.username, account.password, db):
+        if not await verify_login(account.password, existing_account["password_hash"]):
             return {"error": "Incorrect password"}
 
         account_id = existing_account["account_id"]
         is_admin = existing_account["is_admin"]
 
-        db.execute(
-            text("UPDATE accounts SET last_login=NOW() WHERE username=:username"),
-            {"username": account.username}
-        )
-        db.commit()
+        async with engine.connect() as db:
+            await db.execute(
+                text("UPDATE accounts SET last_login=NOW() WHERE account_id=:account_id"),
+                {"account_id": account_id}
+            )
+            await db.commit()
 
-        return {"message": "Login successful", "username": account.username, "account_id": account_id, "is_admin": is_admin}
+        return login_response(account.username, account_id, is_admin)
     except Exception as e:
-        db.rollback()
-        return {"error": f"Login failed: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Login failed: {str(e)}"}
+
+# Resolves the account behind a session token issued at login
+@router.get("/session")
+async def get_session(session=Depends(get_current_account)):
+    return {"username": session["username"], "account_id": session["account_id"], "is_admin": session["is_admin"]}
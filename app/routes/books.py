@@ -1,136 +1,495 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
-import httpx
-from app.helpers.db_helper import get_db
-from app.common.models import ISBNRequest, WishlistRequest
-from app.helpers.llm_helper import generate_summary, generate_embedding
+from app.helpers.db_helper import get_db, engine, build_values
+from app.common.constants import (
+    SUMMARY_CONCURRENCY, EMBEDDING_BATCH_SIZE, INSERT_BATCH_SIZE, ADD_BOOKS_MAX_BATCH, BOOKS_PAGE_SIZE,
+    BOOKS_MAX_PAGE_SIZE, STREAM_CHUNK_SIZE,
+    NEIGHBORS_K, RECOMMENDATIONS_MIN_RATING, WISHLIST_PAGE_SIZE, WISHLIST_MAX_PAGE_SIZE, WISHLIST_MAX_BATCH
+)
+from app.common.models import ISBNRequest, ISBNListRequest, WishlistRequest, WishlistBatchRequest
+from app.helpers.book_helper import (
+    BOOK_COLUMNS, BOOK_STATS_COLUMNS, parse_book_data, parse_fields, listing_query, encode_wishlist_cursor,
+    decode_wishlist_cursor
+)
+from app.helpers.openlibrary_helper import openlibrary_client
+from app.helpers.llm_helper import generate_summary, generate_embeddings
+from app.helpers.enrichment_helper import enqueue_enrichment, enrichment_worker, get_enrichment_status
+from app.helpers.index_helper import embedding_index, index_loaded
+from app.helpers.embedding_helper import embedding_columns
+from app.helpers.neighbors_helper import add_book_neighbors, remove_book_neighbors, refill_book_neighbors
+from app.helpers.cache_helper import cached_json_response, response_cache
 
 router = APIRouter()
 
+# Pages through the catalog by isbn (keyset), so every page costs the same regardless of position.
+# format=ndjson or format=json streams the whole catalog from a server-side cursor instead.
 @router.get("/getAllBooks")
-def get_all_books(db=Depends(get_db)):
-    result = db.execute(text("SELECT * FROM books"))
-    return [dict(row._mapping) for row in result.fetchall()]
+async def get_all_books(
+    limit: int = Header(BOOKS_PAGE_SIZE, alias="limit"),
+    cursor: str | None = Header(None, alias="cursor"),
+    fields: str | None = Header(None, alias="fields"),
+    response_format: str | None = Header(None, alias="format")
+):
+    select, source = listing_query(parse_fields(fields))
+    where = "WHERE b.isbn > :cursor" if cursor else ""
+    params = {"cursor": cursor} if cursor else {}
+
+    if response_format in ("ndjson", "json"):
+        query = text(f"SELECT {select} FROM {source} {where} ORDER BY b.isbn")
+        media_type = "application/x-ndjson" if response_format == "ndjson" else "application/json"
+        return StreamingResponse(stream_books(query, params, response_format), media_type=media_type)
+    if response_format is not None:
+        raise HTTPException(status_code=400, detail="format must be ndjson or json")
+
+    # Only a page needs a connection here; exports stream through their own, so none is held for them
+    limit = max(1, min(limit, BOOKS_MAX_PAGE_SIZE))
+    try:
+        async with engine.connect() as db:
+            result = await db.execute(
+                text(f"SELECT {select} FROM {source} {where} ORDER BY b.isbn LIMIT :limit"),
+                {**params, "limit": limit + 1}
+            )
+            books = [dict(row._mapping) for row in result.fetchall()]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve books: {str(e)}")
+    next_cursor = books[limit - 1]["isbn"] if len(books) > limit else None
+    return {"books": books[:limit], "next_cursor": next_cursor}
+
+# Uses its own connection because the response outlives the request dependency
+async def stream_books(query, params, response_format):
+    async with engine.connect() as conn:
+        result = await conn.stream(query, params)
+        first = True
+        if response_format == "json":
+            yield "["
+        async for partition in result.partitions(STREAM_CHUNK_SIZE):
+            lines = [json.dumps(jsonable_encoder(dict(row._mapping))) for row in partition]
+            if response_format == "ndjson":
+                yield "\n".join(lines) + "\n"
+            else:
+                yield ("" if first else ",") + ",".join(lines)
+            first = False
+        if response_format == "json":
+            yield "]"
 
 @router.post("/addBookFromISBN")
-def add_book_from_isbn(request: ISBNRequest, db=Depends(get_db)):
+async def add_book_from_isbn(request: ISBNRequest, db=Depends(get_db)):
     isbn = request.isbn
-    url = f"https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data"
-    try:
-        with httpx.Client() as client:
-            response = client.get(url)
-            response.raise_for_status()
-            data = response.json()
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=502, detail=f"Upstream HTTP error: {e.response.status_code}")
-    except httpx.RequestError:
-        raise HTTPException(status_code=503, detail="Failed to reach upstream")
-
-    book_data = data.get(f"ISBN:{isbn}", {})
+    data, errors = await openlibrary_client.lookup([isbn])
+    if isbn in errors:
+        raise HTTPException(status_code=errors[isbn].status_code, detail=errors[isbn].detail)
+
+    book_data = data.get(isbn, {})
     if not book_data:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    title = book_data.get("title")
-    authors = [a.get("name") for a in book_data.get("authors", [])]
-    publishers = [p.get("name") for p in book_data.get("publishers", [])]
-    publication_date = book_data.get("publish_date")
-    genres = [s.get("name") for s in book_data.get("subjects", [])]
-    pages = book_data.get("number_of_pages")
-    image = book_data.get("cover", {}).get("medium")
+    book = parse_book_data(isbn, book_data)
 
+    # Summary and embedding generation happen in the enrichment worker, after this transaction commits
     try:
-        db.execute(
+        await db.execute(
             text('''INSERT INTO books(isbn, title, authors, publishers, publication_date, genres, pages, image)
                     VALUES (:isbn, :title, :authors, :publishers, :publication_date, :genres, :pages, :image)'''),
-            {"isbn": isbn, "title": title, "authors": authors, "publishers": publishers,
-             "publication_date": publication_date, "genres": genres, "pages": int(pages) if pages else None, "image": image}
-        )
-        summary = generate_summary(title, authors[0] if len(authors) > 0 else "", isbn, "../prompts/summary_prompt.txt")
-        embedding = generate_embedding(summary)
-        db.execute(
-            text('''INSERT INTO book_embeddings(isbn, summary, embedding)
-                    VALUES (:isbn, :summary, :embedding)'''),
-            {"isbn": isbn, "summary": summary, "embedding": embedding}
+            book
         )
-        db.commit()
-        return {"message": "Book added successfully"}
+        await enqueue_enrichment(db, isbn)
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to add book: {str(e)}")
 
+    enrichment_worker.notify()
+    response_cache.invalidate(f"book:{isbn}")
+    return {"message": "Book added successfully", "enrichment_status": "pending"}
+
+# Imports many books at once: one OpenLibrary lookup per chunk of ISBNs, bounded concurrent summaries,
+# list-input embedding calls and multi-row inserts. Connections are only checked out around the DB work.
+@router.post("/addBooksFromISBNs")
+async def add_books_from_isbns(request: ISBNListRequest):
+    isbns = list(dict.fromkeys(isbn.strip() for isbn in request.isbns if isbn.strip()))
+    if len(isbns) > ADD_BOOKS_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {ADD_BOOKS_MAX_BATCH} ISBNs per request")
+    results = {}
+
+    try:
+        async with engine.connect() as conn:
+            existing = await conn.execute(
+                text('''SELECT isbn FROM books WHERE isbn = ANY(:isbns)'''),
+                {"isbns": isbns}
+            )
+            for row in existing:
+                results[row.isbn] = {"status": "exists", "detail": "Book already exists"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to add books: {str(e)}")
+
+    pending = [isbn for isbn in isbns if isbn not in results]
+    found, errors = await openlibrary_client.lookup(pending)
+    for isbn in pending:
+        if isbn in errors:
+            results[isbn] = {"status": "failed", "detail": errors[isbn].detail}
+        elif isbn not in found:
+            results[isbn] = {"status": "not_found", "detail": "Book not found"}
+
+    books = [parse_book_data(isbn, found[isbn]) for isbn in pending if isbn in found]
+
+    semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+    async def summarize(book):
+        async with semaphore:
+            author = book["authors"][0] if len(book["authors"]) > 0 else ""
+            return await generate_summary(book["title"], author, book["isbn"], "../prompts/summary_prompt.txt")
+
+    summaries = await asyncio.gather(*(summarize(book) for book in books), return_exceptions=True)
+    summarized = []
+    for book, summary in zip(books, summaries):
+        if isinstance(summary, Exception):
+            results[book["isbn"]] = {"status": "failed", "detail": f"Summary failed: {str(summary)}"}
+        else:
+            summarized.append({**book, "summary": summary})
+
+    enriched = []
+    for start in range(0, len(summarized), EMBEDDING_BATCH_SIZE):
+        chunk = summarized[start:start + EMBEDDING_BATCH_SIZE]
+        try:
+            embeddings = await generate_embeddings([book["summary"] for book in chunk])
+        except Exception as e:
+            for book in chunk:
+                results[book["isbn"]] = {"status": "failed", "detail": f"Embedding failed: {str(e)}"}
+            continue
+        enriched.extend({**book, "embedding": embedding} for book, embedding in zip(chunk, embeddings))
+
+    for start in range(0, len(enriched), INSERT_BATCH_SIZE):
+        chunk = enriched[start:start + INSERT_BATCH_SIZE]
+        try:
+            async with engine.connect() as conn:
+                values, params = build_values(chunk, BOOK_COLUMNS)
+                inserted = await conn.execute(
+                    text(f'''INSERT INTO books(isbn, title, authors, publishers, publication_date, genres, pages, image)
+                            VALUES {values}
+                            ON CONFLICT (isbn) DO NOTHING
+                            RETURNING isbn'''),
+                    params
+                )
+                inserted_isbns = {row.isbn for row in inserted}
+                new_books = [book for book in chunk if book["isbn"] in inserted_isbns]
+                if new_books:
+                    values, params = build_values(
+                        [{"isbn": book["isbn"], "summary": book["summary"], **embedding_columns(book["embedding"])}
+                         for book in new_books],
+                        ["isbn", "summary", "embedding", "embedding_blob"],
+                        casts={"embedding": "FLOAT8[]", "embedding_blob": "BYTEA"}
+                    )
+                    await conn.execute(
+                        text(f'''INSERT INTO book_embeddings(isbn, summary, embedding, embedding_blob) VALUES {values}'''),
+                        params
+                    )
+                await conn.commit()
+        except Exception as e:
+            for book in chunk:
+                results[book["isbn"]] = {"status": "failed", "detail": f"Insert failed: {str(e)}"}
+            continue
+
+        for book in chunk:
+            if book["isbn"] not in inserted_isbns:
+                results[book["isbn"]] = {"status": "exists", "detail": "Book already exists"}
+                continue
+            results[book["isbn"]] = {"status": "added", "detail": "Book added successfully"}
+            response_cache.invalidate(f"book:{book['isbn']}")
+        if await index_loaded():
+            # One index update (one snapshot version in multi-worker mode) per inserted chunk
+            await asyncio.to_thread(embedding_index.add_many, [
+                (book["isbn"], book["title"], book["authors"], book["embedding"],
+                 book["genres"], book["pages"], book["publication_date"])
+                for book in chunk if book["isbn"] in inserted_isbns
+            ])
+        await add_book_neighbors([book["isbn"] for book in chunk if book["isbn"] in inserted_isbns])
+
+    added = sum(1 for result in results.values() if result["status"] == "added")
+    return {
+        "message": f"Added {added} of {len(isbns)} books",
+        "results": [{"isbn": isbn, **results[isbn]} for isbn in isbns]
+    }
+
 @router.post("/removeBookFromISBN")
-def remove_book_from_isbn(request: ISBNRequest, db=Depends(get_db)):
+async def remove_book_from_isbn(request: ISBNRequest, db=Depends(get_db)):
     isbn = request.isbn
     try:
-        db.execute(
+        await db.execute(
             text('''DELETE FROM books where isbn = :isbn'''),
             {"isbn": isbn}
         )
-        db.execute(
+        await db.execute(
             text('''DELETE FROM book_embeddings WHERE isbn=:isbn'''),
             {"isbn": isbn}
         )
-        db.commit()
-        return {"message": "Book removed successfully"}
+        await db.execute(
+            text('''DELETE FROM enrichment_jobs WHERE isbn=:isbn'''),
+            {"isbn": isbn}
+        )
+        affected = await remove_book_neighbors(db, isbn)
+        # Hydrated wishlists drop the book and leaderboards drop its stats
+        wishlists = (await db.execute(
+            text('''SELECT DISTINCT account_id FROM wishlist WHERE isbn = :isbn'''),
+            {"isbn": isbn}
+        )).scalars().all()
+        await db.commit()
+        await asyncio.to_thread(embedding_index.remove, isbn)
+        response_cache.invalidate(f"book:{isbn}", f"reviews:{isbn}", "review_stats",
+                                  *(f"wishlist:{account_id}" for account_id in wishlists))
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete book: {str(e)}")
+    await refill_book_neighbors(isbn, affected)
+    return {"message": "Book removed successfully"}
     
+# Served through the response cache; a connection is only checked out on a miss
 @router.get('/getBookSummary')
-def get_book_summary(book_isbn: str = Header(..., alias="isbn"), db=Depends(get_db)):
+async def get_book_summary(request: Request, book_isbn: str = Header(..., alias="isbn")):
+    async def load():
+        try:
+            async with engine.connect() as db:
+                result = await db.execute(
+                    text('''SELECT summary from book_embeddings WHERE isbn=:isbn'''),
+                    {"isbn": book_isbn}
+                )
+                row = result.first()
+                if row:
+                    return dict(row._mapping)
+                # The book may still be waiting on the enrichment worker
+                status = await get_enrichment_status(db, book_isbn)
+                return {"summary": None, "enrichment_status": status["status"]} if status else None
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve book summary: {str(e)}")
+
+    return await cached_json_response(request, ("summary", book_isbn), [f"book:{book_isbn}"], load)
+
+# Precomputed nearest neighbors (see neighbors_helper), most similar first
+@router.get("/similarBooks")
+async def get_similar_books(
+    request: Request,
+    book_isbn: str = Header(..., alias="isbn"),
+    limit: int = Header(NEIGHBORS_K, alias="limit")
+):
+    limit = max(1, min(limit, NEIGHBORS_K))
+
+    async def load():
+        try:
+            async with engine.connect() as db:
+                result = await db.execute(
+                    text('''SELECT b.isbn, b.title, b.authors, b.image, n.similarity
+                            FROM book_neighbors n JOIN books b ON b.isbn = n.neighbor_isbn
+                            WHERE n.isbn = :isbn
+                            ORDER BY n.similarity DESC LIMIT :limit'''),
+                    {"isbn": book_isbn, "limit": limit}
+                )
+                books = [dict(row._mapping) for row in result]
+                if books:
+                    return {"isbn": book_isbn, "similar": books}
+                exists = await db.execute(text('''SELECT 1 FROM books WHERE isbn = :isbn'''), {"isbn": book_isbn})
+                return {"isbn": book_isbn, "similar": []} if exists.first() else None
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve similar books: {str(e)}")
+
+    return await cached_json_response(
+        request, ("similar", book_isbn, limit), [f"neighbors:{book_isbn}", f"book:{book_isbn}"], load
+    )
+
+# Blends the neighbor lists of the account's wishlist (weight 1) and of books it rated at least
+# RECOMMENDATIONS_MIN_RATING (weight rating / 5), leaving out books it already wishlisted or reviewed
+@router.get("/recommendations")
+async def get_recommendations(
+    account_id: int = Header(..., alias="account_id"),
+    limit: int = Header(NEIGHBORS_K, alias="limit"),
+    db=Depends(get_db)
+):
+    limit = max(1, min(limit, BOOKS_MAX_PAGE_SIZE))
     try:
-        result = db.execute(
-            text('''SELECT summary from book_embeddings WHERE isbn=:isbn'''),
-            {"isbn": book_isbn}
+        result = await db.execute(
+            text('''WITH seeds AS (
+                        SELECT isbn, 1.0 AS weight FROM wishlist WHERE account_id = :account_id
+                        UNION ALL
+                        SELECT book_isbn, rating / 5.0 FROM reviews
+                        WHERE account_id = :account_id AND rating >= :min_rating
+                    ), seen AS (
+                        SELECT isbn FROM wishlist WHERE account_id = :account_id
+                        UNION
+                        SELECT book_isbn FROM reviews WHERE account_id = :account_id
+                    )
+                    SELECT b.isbn, b.title, b.authors, b.image,
+                           CAST(SUM(s.weight * n.similarity) AS DOUBLE PRECISION) AS score,
+                           ARRAY_AGG(DISTINCT s.isbn) AS because_of
+                    FROM seeds s
+                    JOIN book_neighbors n ON n.isbn = s.isbn
+                    JOIN books b ON b.isbn = n.neighbor_isbn
+                    WHERE NOT EXISTS (SELECT 1 FROM seen WHERE seen.isbn = n.neighbor_isbn)
+                    GROUP BY b.isbn, b.title, b.authors, b.image
+                    ORDER BY score DESC, b.isbn
+                    LIMIT :limit'''),
+            {"account_id": account_id, "min_rating": RECOMMENDATIONS_MIN_RATING, "limit": limit}
         )
-        row = result.first()
-        return dict(row._mapping) if row else None
+        return {"account_id": account_id, "recommendations": [dict(row._mapping) for row in result]}
     except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve book summary: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve recommendations: {str(e)}")
+
+@router.get('/getEnrichmentStatus')
+async def get_book_enrichment_status(book_isbn: str = Header(..., alias="isbn"), db=Depends(get_db)):
+    try:
+        status = await get_enrichment_status(db, book_isbn)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve enrichment status: {str(e)}")
+    if not status:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return status
         
 @router.post("/addToWishlist")
-def add_book_to_wishlist(request: WishlistRequest, db=Depends(get_db)):
+async def add_book_to_wishlist(request: WishlistRequest, db=Depends(get_db)):
     account_id = request.account_id
     isbn = request.isbn
     try:
-        db.execute(
+        await db.execute(
             text('''INSERT INTO wishlist (account_id, isbn)
-                    VALUES (:account_id, :isbn)'''),
+                    VALUES (:account_id, :isbn)
+                    ON CONFLICT (account_id, isbn) DO NOTHING'''),
             {"account_id": account_id, "isbn": isbn}
         )
-        db.commit()
+        await db.commit()
+        response_cache.invalidate(f"wishlist:{account_id}")
         return {"message": "Wishlist item added successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to add wishlist item: {str(e)}")
     
 @router.post("/removeFromWishlist")
-def remove_from_wishlist(request: WishlistRequest, db=Depends(get_db)):
+async def remove_from_wishlist(request: WishlistRequest, db=Depends(get_db)):
     account_id = request.account_id
     isbn = request.isbn
     try:
-        db.execute(
+        await db.execute(
             text('''DELETE FROM wishlist
                     WHERE account_id = :account_id AND isbn = :isbn'''),
             {"account_id": account_id, "isbn": isbn}
         )
-        db.commit()
+        await db.commit()
+        response_cache.invalidate(f"wishlist:{account_id}")
         return {"message": "Wishlist item removed successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to remove wishlist item: {str(e)}")
     
-@router.get("/getWishlistByAccountId")
-def get_wishlist_by_account_id(account_id: int = Header(..., alias="account_id"), db=Depends(get_db)):
+def batch_isbns(isbns: list[str]) -> list[str]:
+    isbns = list(dict.fromkeys(isbn.strip() for isbn in isbns if isbn.strip()))
+    if len(isbns) > WISHLIST_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {WISHLIST_MAX_BATCH} ISBNs per request")
+    return isbns
+
+# Adds many books in one statement; ISBNs already on the wishlist are left alone and unknown ones reported
+@router.post("/addToWishlistBatch")
+async def add_books_to_wishlist(request: WishlistBatchRequest, db=Depends(get_db)):
+    isbns = batch_isbns(request.isbns)
     try:
-        result = db.execute(
-            text('''SELECT isbn 
-                    FROM wishlist 
-                    WHERE account_id = :account_id'''),
-            {"account_id": account_id}
+        result = await db.execute(
+            text('''WITH found AS (
+                        SELECT isbn FROM books WHERE isbn = ANY(:isbns)
+                    ), inserted AS (
+                        INSERT INTO wishlist (account_id, isbn)
+                        SELECT :account_id, isbn FROM found
+                        ON CONFLICT (account_id, isbn) DO NOTHING
+                        RETURNING isbn
+                    )
+                    SELECT f.isbn, i.isbn IS NOT NULL AS added
+                    FROM found f LEFT JOIN inserted i ON i.isbn = f.isbn'''),
+            {"account_id": request.account_id, "isbns": isbns}
         )
-        wishlist_items = [row.isbn for row in result]
-        return wishlist_items
+        found = {row.isbn: row.added for row in result}
+        await db.commit()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve wishlist: {str(e)}")
\ No newline at end of file
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to add wishlist items: {str(e)}")
+    response_cache.invalidate(f"wishlist:{request.account_id}")
+    return {
+        "added": [isbn for isbn in isbns if found.get(isbn)],
+        "already_present": [isbn for isbn in isbns if found.get(isbn) is False],
+        "not_found": [isbn for isbn in isbns if isbn not in found]
+    }
+
+@router.post("/removeFromWishlistBatch")
+async def remove_books_from_wishlist(request: WishlistBatchRequest, db=Depends(get_db)):
+    isbns = batch_isbns(request.isbns)
+    try:
+        result = await db.execute(
+            text('''DELETE FROM wishlist
+                    WHERE account_id = :account_id AND isbn = ANY(:isbns)
+                    RETURNING isbn'''),
+            {"account_id": request.account_id, "isbns": isbns}
+        )
+        removed = {row.isbn for row in result}
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to remove wishlist items: {str(e)}")
+    response_cache.invalidate(f"wishlist:{request.account_id}")
+    return {
+        "removed": [isbn for isbn in isbns if isbn in removed],
+        "not_present": [isbn for isbn in isbns if isbn not in removed]
+    }
+
+# The wishlist joined with its books in one query, newest first, with the same fields header as /getAllBooks
+@router.get("/getWishlist")
+async def get_wishlist(
+    request: Request,
+    account_id: int = Header(..., alias="account_id"),
+    fields: str | None = Header(None, alias="fields"),
+    limit: int = Header(WISHLIST_PAGE_SIZE, alias="limit"),
+    cursor: str | None = Header(None, alias="cursor")
+):
+    columns = parse_fields(fields)
+    select, source = listing_query(columns)
+    limit = max(1, min(limit, WISHLIST_MAX_PAGE_SIZE))
+    params = {"account_id": account_id, "limit": limit + 1}
+    after = ""
+    if cursor:
+        params["cursor_added_at"], params["cursor_isbn"] = decode_wishlist_cursor(cursor)
+        after = "AND (w.added_at, w.isbn) < (:cursor_added_at, :cursor_isbn)"
+
+    async def load():
+        try:
+            async with engine.connect() as db:
+                result = await db.execute(
+                    text(f'''SELECT {select}, w.added_at
+                             FROM {source} JOIN wishlist w ON w.isbn = b.isbn
+                             WHERE w.account_id = :account_id {after}
+                             ORDER BY w.added_at DESC, w.isbn DESC
+                             LIMIT :limit'''),
+                    params
+                )
+                books = [dict(row._mapping) for row in result]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve wishlist: {str(e)}")
+        next_cursor = encode_wishlist_cursor(books[limit - 1]) if len(books) > limit else None
+        return {"books": books[:limit], "next_cursor": next_cursor}
+
+    tags = [f"wishlist:{account_id}"]
+    if any(column in BOOK_STATS_COLUMNS for column in columns):
+        tags.append("review_stats")
+    return await cached_json_response(request, ("wishlist_books", account_id, tuple(columns), limit, cursor), tags, load)
+
+@router.get("/getWishlistByAccountId")
+async def get_wishlist_by_account_id(request: Request, account_id: int = Header(..., alias="account_id")):
+    async def load():
+        try:
+            async with engine.connect() as db:
+                result = await db.execute(
+                    text('''SELECT isbn 
+                            FROM wishlist 
+                            WHERE account_id = :account_id'''),
+                    {"account_id": account_id}
+                )
+                return [row.isbn for row in result]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve wishlist: {str(e)}")
+
+    return await cached_json_response(request, ("wishlist", account_id), [f"wishlist:{account_id}"], load)
\ No newline at end of file
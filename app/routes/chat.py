@@ -1,35 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+import time
+from fastapi import APIRouter, HTTPException, Header
 from fastapi.responses import StreamingResponse
-from sqlalchemy import text
-from app.helpers.db_helper import get_db
-from app.helpers.llm_helper import get_most_similar, generate_query_response
+from app.common.constants import CHAT_TOP_K, CHAT_MAX_TOP_K
+from app.helpers.index_helper import ensure_index_loaded
+from app.helpers.search_helper import SearchFilters
+from app.helpers.llm_helper import get_most_similar, generate_query_embedding, generate_query_response, prompt_hash
+from app.helpers.answer_cache_helper import answer_cache, answer_signature
+from app.helpers.metrics_helper import CHAT_FIRST_TOKEN_SECONDS
 
 router = APIRouter()
 
-@router.get("/chat")
-def chat(query: str = Header(..., alias="query"), db=Depends(get_db)):
-    try:
-        result = db.execute(
-            text('''SELECT b.isbn, b.title, b.authors, be.embedding
-                FROM books b join book_embeddings be ON b.isbn = be.isbn'''))
-        books = result.fetchall()
-
-        most_similar = get_most_similar(books, query)
-
-        return StreamingResponse(
-            generate_query_response(query, most_similar, "../prompts/chat_prompt.txt"),
-            media_type="text/event-stream"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get response: {str(e)}")
-
+CHAT_PROMPT_PATH = "../prompts/chat_prompt.txt"
 
+async def record_first_token(stream, started: float):
+    first = True
+    async for chunk in stream:
+        if first:
+            CHAT_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+            first = False
+        yield chunk
 
+async def replay_answer(chunks):
+    for chunk in chunks:
+        yield chunk
 
+# Passes the completion through and caches it once it has streamed to the end; answers cut short are not kept
+async def cache_answer(stream, signature: tuple, query_embedding):
+    started = time.perf_counter()
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        yield chunk
+    answer_cache.put(signature, query_embedding, chunks, time.perf_counter() - started)
 
-        
-
-
+# Does not hold a pooled connection: the index is served from memory, so nothing is checked out while the answer streams
+@router.get("/chat")
+async def chat(
+    query: str = Header(..., alias="query"),
+    top_k: int = Header(CHAT_TOP_K, alias="top_k"),
+    genre: str | None = Header(None, alias="genre"),
+    min_pages: int | None = Header(None, alias="min_pages"),
+    max_pages: int | None = Header(None, alias="max_pages"),
+    min_year: int | None = Header(None, alias="min_year"),
+    max_year: int | None = Header(None, alias="max_year")
+):
+    started = time.perf_counter()
+    top_k = max(1, min(top_k, CHAT_MAX_TOP_K))
+    filters = SearchFilters(genre, min_pages, max_pages, min_year, max_year)
+    try:
+        await ensure_index_loaded()
 
+        query_embedding = await generate_query_embedding(query)
+        most_similar = await get_most_similar(query, top_k, filters, query_embedding)
 
+        # Near-identical questions answered from the same books replay the stored completion
+        signature = answer_signature(prompt_hash(CHAT_PROMPT_PATH), most_similar)
+        cached = answer_cache.get(signature, query_embedding)
+        if cached is not None:
+            stream = replay_answer(cached.chunks)
+        else:
+            stream = cache_answer(generate_query_response(query, most_similar, CHAT_PROMPT_PATH), signature, query_embedding)
 
+        return StreamingResponse(record_first_token(stream, started), media_type="text/event-stream")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get response: {str(e)}")
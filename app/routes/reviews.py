@@ -1,151 +1,272 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+import json
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
-from app.helpers.db_helper import get_db
-from app.helpers.contest_helper import choose_winner
-from app.helpers.reviews_helper import process_reviews
+from app.helpers.db_helper import get_db, engine, build_values
+from app.helpers.cache_helper import cached_json_response, response_cache
+from app.helpers.contest_helper import review_sampler, ensure_sampler_loaded
+from app.helpers.reviews_helper import (
+    REVIEW_SORTS, parse_review_sections, process_reviews, encode_review_cursor, decode_review_cursor
+)
+from app.helpers.likes_helper import like_buffer
+from app.helpers.review_stats_helper import LEADERBOARDS, apply_review_changes
+from app.helpers.review_transfer_helper import IMPORT_FORMATS, import_reviews, stream_export
+from app.helpers.account_helper import get_admin_account
+from app.common.models import LikeRequest
+from app.common.constants import (
+    REVIEWS_PAGE_SIZE, REVIEWS_MAX_PAGE_SIZE, LEADERBOARD_SIZE, LEADERBOARD_MAX_SIZE, LEADERBOARD_MIN_RATINGS
+)
 
 router = APIRouter()
 
 @router.post("/submitReview")
-def submit_review(request: dict, db=Depends(get_db)):
+async def submit_review(request: dict, db=Depends(get_db)):
     account_id = request.get("account_id")
     review_text = request.get("review_text")
     rating = request.get("rating")
     book_isbn = request.get("book_isbn")
+    # Parsed once here so readers get the stored sections instead of re-parsing the text
+    sections = parse_review_sections(review_text)
 
     try:
-        db.execute(
-            text('''INSERT INTO reviews (account_id, review_text, rating, review_date, book_isbn)
-                    VALUES (:account_id, :review_text, :rating, NOW(), :book_isbn)'''),
-                {"account_id": account_id, "review_text": review_text, "rating": rating, "book_isbn": book_isbn}
+        inserted = await db.execute(
+            text('''INSERT INTO reviews (account_id, review_text, rating, review_date, book_isbn, sections)
+                    VALUES (:account_id, :review_text, :rating, NOW(), :book_isbn, :sections)
+                    RETURNING account_id, book_isbn, rating, likes'''),
+                {"account_id": account_id, "review_text": review_text, "rating": rating, "book_isbn": book_isbn,
+                 "sections": json.dumps(sections)}
         )
-        db.commit()
+        await apply_review_changes(db, inserted.mappings().all(), 1)
+        await db.commit()
+        review_sampler.update(account_id, 1)
+        response_cache.invalidate(f"reviews:{book_isbn}", "review_stats")
         return {"message": "Review submitted successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to submit review: {str(e)}")
     
 @router.get("/getReviewsByBook")
-def get_reviews_by_book(book_isbn: str = Header(..., alias="isbn"), db=Depends(get_db)):
-    try:
-        result = db.execute(
-            text('''SELECT r.review_id, r.review_text, r.rating, r.review_date, r.book_isbn, a.account_id, a.username, r.likes
-                    FROM reviews r join accounts a on r.account_id = a.account_id WHERE r.book_isbn = :book_isbn'''),
-                {"book_isbn": book_isbn}
-        )
-        reviews = [dict(row._mapping) for row in result.fetchall()]
-        process_reviews(reviews)
-        print(reviews)
-        return reviews
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve reviews: {str(e)}")
+async def get_reviews_by_book(
+    request: Request,
+    book_isbn: str = Header(..., alias="isbn"),
+    sort: str = Header("recent", alias="sort"),
+    limit: int = Header(REVIEWS_PAGE_SIZE, alias="limit"),
+    cursor: str | None = Header(None, alias="cursor")
+):
+    if sort not in REVIEW_SORTS:
+        raise HTTPException(status_code=400, detail="sort must be recent or liked")
+    limit = max(1, min(limit, REVIEWS_MAX_PAGE_SIZE))
+    sort_column = REVIEW_SORTS[sort][0]
+    params = {"book_isbn": book_isbn, "limit": limit + 1}
+    after = ""
+    if cursor:
+        params["cursor_value"], params["cursor_id"] = decode_review_cursor(cursor, sort)
+        after = f"AND ({sort_column}, r.review_id) < (:cursor_value, :cursor_id)"
+
+    async def load():
+        try:
+            async with engine.connect() as db:
+                result = await db.execute(
+                    text(f'''SELECT r.review_id, r.review_text, r.sections, r.rating, r.review_date, r.book_isbn, a.account_id, a.username, r.likes
+                            FROM reviews r join accounts a on r.account_id = a.account_id
+                            WHERE r.book_isbn = :book_isbn {after}
+                            ORDER BY {sort_column} DESC, r.review_id DESC
+                            LIMIT :limit'''),
+                        params
+                )
+                reviews = [dict(row._mapping) for row in result.fetchall()]
+            next_cursor = encode_review_cursor(reviews[limit - 1], sort) if len(reviews) > limit else None
+            reviews = reviews[:limit]
+            process_reviews(reviews)
+            pending = like_buffer.pending_deltas()
+            for review in reviews:
+                review["likes"] += pending.get(review["review_id"], 0)
+            return {"reviews": reviews, "next_cursor": next_cursor}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve reviews: {str(e)}")
+
+    key = ("reviews", book_isbn, sort, limit, cursor)
+    return await cached_json_response(request, key, [f"reviews:{book_isbn}"], load)
     
 @router.post("/deleteReviewByReviewId")
-def delete_review_by_review_id(request: dict, db=Depends(get_db)):
+async def delete_review_by_review_id(request: dict, db=Depends(get_db)):
     review_id = request.get("review_id")
 
     try:
-        db.execute(
-            text('''DELETE FROM reviews WHERE review_id = :review_id'''),
+        deleted = (await db.execute(
+            text('''DELETE FROM reviews WHERE review_id = :review_id RETURNING account_id, book_isbn, rating, likes'''),
                 {"review_id": review_id}
-        )
-        db.commit()
+        )).mappings().all()
+        await apply_review_changes(db, deleted, -1)
+        await db.commit()
+        for row in deleted:
+            review_sampler.update(row["account_id"], -1)
+            response_cache.invalidate(f"reviews:{row['book_isbn']}", "review_stats")
         return {"message": "Review deleted successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete review: {str(e)}")
     
-@router.post("/modifyLikeCount")
-def modify_like_count(request: dict, db=Depends(get_db)):
-    review_id = request.get("review_id")
-    action = request.get("action")
-    account_id = request.get("account_id")
-    isbn = request.get("isbn")
+# Streams the request body (NDJSON or CSV with a header row) into reviews through COPY, in chunks.
+# Each record needs account_id, book_isbn and review_text, and may have rating and review_date.
+@router.post("/importReviews")
+async def import_reviews_in_bulk(
+    request: Request,
+    source_format: str = Header("ndjson", alias="format"),
+    require_sections: bool = Header(False, alias="require_sections"),
+    session=Depends(get_admin_account)
+):
+    if source_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    try:
+        return await import_reviews(request.stream(), source_format, require_sections)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8")
+
+def export_response(kind: str, target_format: str) -> StreamingResponse:
+    if target_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    media_type = "text/csv" if target_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_export(kind, target_format), media_type=media_type)
 
-    if action not in ("like", "unlike"):
-        raise HTTPException(status_code=400, detail="Invalid action")
+@router.get("/exportReviews")
+async def export_reviews(target_format: str = Header("ndjson", alias="format"), session=Depends(get_admin_account)):
+    return export_response("reviews", target_format)
 
-    increment = 1 if action == "like" else -1
+@router.get("/exportReviewLikes")
+async def export_review_likes(target_format: str = Header("ndjson", alias="format"), session=Depends(get_admin_account)):
+    return export_response("likes", target_format)
 
+@router.post("/modifyLikeCount")
+async def modify_like_count(request: LikeRequest, db=Depends(get_db)):
+    review_id = request.review_id
+    account_id = request.account_id
+    isbn = request.isbn
+    liked = request.action == "like"
+
+    # The write is buffered and flushed in batches; only the committed state of a pair
+    # not already in the buffer is read here, so pending deltas stay exact
     try:
-        db.execute(
-            text("""
-                UPDATE reviews
-                SET likes = likes + :inc
-                WHERE review_id = :review_id
-            """),
-            {"inc": increment, "review_id": review_id}
-        )
-        if action == "like":
-            db.execute(
-                text('''INSERT INTO review_likes (review_id, account_id, isbn) VALUES (:review_id, :account_id, :isbn)'''),
-                    {"review_id": review_id, "account_id": account_id, "isbn": isbn}
-            )
-        else:
-            db.execute(
-                text('''DELETE FROM review_likes WHERE review_id = :review_id AND account_id = :account_id'''),
+        current = like_buffer.current_state(review_id, account_id)
+        baseline = None
+        if current is None:
+            baseline = (await db.execute(
+                text('''SELECT 1 FROM review_likes WHERE review_id = :review_id AND account_id = :account_id'''),
                     {"review_id": review_id, "account_id": account_id}
-            )
-        db.commit()
-        return {"message": "Review likes updated"}
+            )).first() is not None
+            current = baseline
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Likes action failed: {str(e)}")
+
+    if current == liked:
+        return {"message": "Review likes unchanged"}
+    like_buffer.record(review_id, account_id, isbn, liked, baseline)
+    response_cache.invalidate(f"reviews:{isbn}", f"liked:{account_id}:{isbn}")
+    return {"message": "Review likes updated"}
     
 # Get the reviews a user liked for a given book
 
 @router.get("/getLikedByISBN")
-def get_liked_by_isbn(book_isbn: str = Header(..., alias="book_isbn"), account_id: str = Header(..., alias="account_id"), db=Depends(get_db)):
-    try:
-        result = db.execute(
-            text('''SELECT review_id from review_likes WHERE isbn = :book_isbn AND account_id = :account_id'''),
-                {"book_isbn": book_isbn, "account_id": account_id}
-        )
-        liked_ids = [row[0] for row in result.fetchall()]
-        return liked_ids
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve reviews: {str(e)}")
+async def get_liked_by_isbn(request: Request, book_isbn: str = Header(..., alias="book_isbn"), account_id: int = Header(..., alias="account_id")):
+    async def load():
+        try:
+            async with engine.connect() as db:
+                result = await db.execute(
+                    text('''SELECT review_id from review_likes WHERE isbn = :book_isbn AND account_id = :account_id'''),
+                        {"book_isbn": book_isbn, "account_id": account_id}
+                )
+                liked_ids = {row[0] for row in result.fetchall()}
+            for review_id, liked in like_buffer.pending_likes(account_id, book_isbn).items():
+                if liked:
+                    liked_ids.add(review_id)
+                else:
+                    liked_ids.discard(review_id)
+            return sorted(liked_ids)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve reviews: {str(e)}")
+
+    tags = [f"liked:{account_id}:{book_isbn}", f"reviews:{book_isbn}"]
+    return await cached_json_response(request, ("liked", book_isbn, account_id), tags, load)
     
+# board: top_rated, most_reviewed, top_reviewers or most_liked_reviewers; served from the review stats tables
+@router.get("/getLeaderboard")
+async def get_leaderboard(
+    request: Request,
+    board: str = Header("top_rated", alias="board"),
+    limit: int = Header(LEADERBOARD_SIZE, alias="limit")
+):
+    if board not in LEADERBOARDS:
+        raise HTTPException(status_code=400, detail=f"board must be one of {', '.join(LEADERBOARDS)}")
+    limit = max(1, min(limit, LEADERBOARD_MAX_SIZE))
+
+    async def load():
+        try:
+            async with engine.connect() as db:
+                result = await db.execute(
+                    text(LEADERBOARDS[board]), {"limit": limit, "min_ratings": LEADERBOARD_MIN_RATINGS}
+                )
+                return {"board": board, "entries": [dict(row._mapping) for row in result]}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to retrieve leaderboard: {str(e)}")
+
+    return await cached_json_response(request, ("leaderboard", board, limit), ["review_stats"], load)
+
+# Optional body: {"count": number of distinct winners, "seed": seed for a reproducible draw}
 @router.post("/selectContestWinner")
-def select_contest_winner(db=Depends(get_db)):
+async def select_contest_winner(request: dict | None = None, db=Depends(get_db)):
+    request = request or {}
+    count = request.get("count", 1)
+    seed = request.get("seed")
+    if not isinstance(count, int) or count < 1:
+        raise HTTPException(status_code=400, detail="count must be a positive integer")
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        raise HTTPException(status_code=400, detail="seed must be a non-negative integer")
+
     try:
-        rows = db.execute(
-            text('''SELECT a.username, COUNT(*) as review_count FROM accounts a JOIN reviews r
-                    ON a.account_id = r.account_id GROUP BY a.username HAVING COUNT(*) > 0''')
-        ).mappings().all()
-        
-        accounts_and_counts = [(row['username'], row['review_count']) for row in rows]
+        await ensure_sampler_loaded(db)
+        rng = np.random.default_rng(seed)
+        account_ids = [review_sampler.sample(rng)] if count == 1 else review_sampler.sample_many(count, rng)
+        account_ids = [account_id for account_id in account_ids if account_id is not None]
 
-        if not accounts_and_counts:
+        if not account_ids:
             return {"message": "No reviews found to select a winner."}
-        
-        winner = choose_winner(accounts_and_counts)
-        
-        db.execute(
-            text('''INSERT INTO contest_winners (winner_username, win_time)
-                    VALUES (:winner, NOW())'''),
-                {"winner": winner}
+
+        rows = (await db.execute(
+            text('''SELECT account_id, username FROM accounts WHERE account_id = ANY(:account_ids)'''),
+                {"account_ids": account_ids}
+        )).mappings().all()
+        usernames = {row["account_id"]: row["username"] for row in rows}
+        winners = [usernames[account_id] for account_id in account_ids if account_id in usernames]
+        if not winners:
+            return {"message": "No reviews found to select a winner."}
+
+        values, params = build_values([{"winner": winner} for winner in winners], ["winner"])
+        await db.execute(
+            text(f'''INSERT INTO contest_winners (winner_username, win_time)
+                    SELECT v.winner, NOW() FROM (VALUES {values}) AS v(winner)'''),
+                params
         )
-        db.commit()
+        await db.commit()
         
-        return {"winner": winner}
+        return {"winner": winners[0], "winners": winners}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve reviews: {str(e)}")
     
 @router.get("/getRecentWinners")
-def get_recent_winners(db=Depends(get_db)):
+async def get_recent_winners(db=Depends(get_db)):
     """
     Returns up to the 5 most recent contest winners, ordered by win_time descending.
     """
     try:
-        rows = db.execute(
+        rows = (await db.execute(
             text('''
                 SELECT winner_username, win_time
                 FROM contest_winners
                 ORDER BY win_time DESC
                 LIMIT 5
             ''')
-        ).mappings().all()
+        )).mappings().all()
 
         recent_winners = [
             {"winner_username": row["winner_username"], "win_time": row["win_time"]}
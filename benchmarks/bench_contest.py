@@ -0,0 +1,43 @@
+import argparse
+import time
+import numpy as np
+from app.helpers.contest_helper import choose_winner, ReviewCountSampler
+
+# Compares contest draws with the per-draw prefix-sum rebuild (choose_winner) against the
+# incrementally maintained Fenwick sampler, at the scale of a large account base.
+#   python -m benchmarks.bench_contest --accounts 1000000 --draws 20
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=1_000_000)
+    parser.add_argument("--draws", type=int, default=20)
+    parser.add_argument("--winners", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    counts = rng.zipf(2.0, size=args.accounts).clip(max=10_000)
+    accounts_and_counts = list(zip(range(args.accounts), counts.tolist()))
+
+    sampler = ReviewCountSampler()
+    load_seconds = timed(lambda: sampler.load(accounts_and_counts), 1)
+    prefix_seconds = timed(lambda: choose_winner(accounts_and_counts), args.draws)
+    sample_seconds = timed(lambda: sampler.sample(rng), args.draws * 100)
+    update_seconds = timed(lambda: sampler.update(int(rng.integers(args.accounts)), 1), args.draws * 100)
+    many_seconds = timed(lambda: sampler.sample_many(args.winners, rng), args.draws)
+
+    print(f"accounts: {args.accounts:,}  reviews: {int(counts.sum()):,}")
+    print(f"prefix-sum rebuild + draw:     {prefix_seconds * 1000:10.3f} ms/draw")
+    print(f"fenwick initial load:          {load_seconds * 1000:10.3f} ms (once)")
+    print(f"fenwick draw:                  {sample_seconds * 1e6:10.3f} us/draw")
+    print(f"fenwick update:                {update_seconds * 1e6:10.3f} us/review")
+    print(f"vectorized {args.winners} distinct winners: {many_seconds * 1000:7.3f} ms/draw")
+
+if __name__ == "__main__":
+    main()
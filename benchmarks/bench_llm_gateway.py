@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+# Fires a burst of concurrent embedding requests (with repeats) at the local fake OpenAI server,
+# once as one direct call per request and once through the gateway, and compares upstream calls,
+# rate-limit rejections and failures. The fake server rejects calls above --max-inflight with 429.
+#   python -m benchmarks.bench_llm_gateway --requests 2000 --unique 500 --max-inflight 8
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--unique", type=int, default=500)
+    parser.add_argument("--port", type=int, default=8111)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--max-inflight", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Settings are read at import time, so point the app at the fake server before importing it
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["LLM_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3")
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(args.max_inflight))
+    from benchmarks.fake_openai import serve_in_thread
+    from app.helpers.llm_gateway_helper import llm_gateway, LLM_RETRIES, EMBEDDING_MODEL
+
+    server, state = serve_in_thread(args.port, latency_ms=args.latency_ms, max_inflight=args.max_inflight)
+    rng = random.Random(args.seed)
+    texts = [f"question {rng.randrange(args.unique)}" for _ in range(args.requests)]
+
+    async def direct():
+        async def one(text):
+            try:
+                await llm_gateway.client.embeddings.create(input=text, model=EMBEDDING_MODEL)
+                return True
+            except Exception:
+                return False
+        return await asyncio.gather(*(one(text) for text in texts))
+
+    async def gateway():
+        async def one(text):
+            try:
+                await llm_gateway.embed(text)
+                return True
+            except Exception:
+                return False
+        return await asyncio.gather(*(one(text) for text in texts))
+
+    async def compare():
+        print(f"requests: {args.requests:,}  distinct texts: {len(set(texts)):,}  server concurrency limit: {args.max_inflight}")
+        print(f"{'mode':>8} {'seconds':>8} {'ok':>6} {'failed':>7} {'upstream calls':>15} {'429s':>6} {'retries':>8}")
+        for name, run in (("direct", direct), ("gateway", gateway)):
+            before = dict(state.stats)
+            retries_before = sum(LLM_RETRIES._values.values())
+            start = time.perf_counter()
+            results = await run()
+            seconds = time.perf_counter() - start
+            rejected = state.stats["rate_limited"] - before["rate_limited"]
+            calls = state.stats["embedding_requests"] - before["embedding_requests"] + rejected
+            retries = sum(LLM_RETRIES._values.values()) - retries_before
+            print(f"{name:>8} {seconds:>8.2f} {sum(results):>6} {len(results) - sum(results):>7} "
+                  f"{calls:>15,} {rejected:>6} {retries:>8}")
+        await llm_gateway.close()
+
+    asyncio.run(compare())
+    server.should_exit = True
+
+if __name__ == "__main__":
+    main()
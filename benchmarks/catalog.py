@@ -0,0 +1,102 @@
+import hashlib
+import json
+import random
+from app.helpers.book_helper import parse_book_data
+from app.helpers.reviews_helper import parse_review_sections
+from benchmarks.fake_openai import text_embedding
+
+# Seeded synthetic catalog shared by the benchmarks and the fake servers. A book is derived from its
+# ISBN alone, so the fake OpenLibrary server, the database seed and the micro-benchmarks agree on every
+# record, and a book's stored embedding is the one the fake OpenAI server returns for its summary.
+
+GENRES = ["Fantasy", "Science Fiction", "Mystery", "Romance", "Horror", "History", "Biography",
+          "Poetry", "Thriller", "Young Adult", "Philosophy", "Travel"]
+WORDS = ["river", "shadow", "garden", "empire", "winter", "glass", "letter", "storm", "orchard", "harbor",
+         "lantern", "mountain", "silence", "engine", "forest", "crown", "island", "mirror", "ember", "voyage"]
+NAMES = ["Ada", "Bram", "Clara", "Dmitri", "Elena", "Farah", "Gus", "Hana", "Ivo", "Jun", "Kofi", "Lena",
+         "Mateo", "Nadia", "Oren", "Priya", "Quinn", "Rosa", "Sami", "Tova"]
+SURNAMES = ["Abbott", "Berg", "Castillo", "Dube", "Eriksen", "Fujita", "Grant", "Haddad", "Iyer", "Jansen",
+            "Kowalski", "Laurent", "Moreau", "Nakamura", "Okafor", "Petrov", "Reyes", "Silva", "Tan", "Varga"]
+
+# Every seeded account has this password
+BENCH_PASSWORD = "benchmark-password"
+
+def make_isbn(number: int) -> str:
+    body = f"978{number:09d}"
+    check = (10 - sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(body)) % 10) % 10
+    return body + str(check)
+
+def account_username(account_id: int) -> str:
+    return f"bench_user_{account_id}"
+
+def _rng(*parts) -> random.Random:
+    return random.Random(int.from_bytes(hashlib.sha256(":".join(map(str, parts)).encode()).digest()[:8], "little"))
+
+# An OpenLibrary jscmd=data record for any ISBN
+def openlibrary_record(isbn: str) -> dict:
+    rng = _rng("book", isbn)
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).title()
+    authors = [f"{rng.choice(NAMES)} {rng.choice(SURNAMES)}" for _ in range(rng.choice((1, 1, 1, 2)))]
+    return {
+        "title": f"The {title}",
+        "authors": [{"name": name} for name in authors],
+        "publishers": [{"name": f"{rng.choice(SURNAMES)} Press"}],
+        "publish_date": str(rng.randint(1850, 2025)),
+        "subjects": [{"name": genre} for genre in rng.sample(GENRES, rng.randint(1, 3))],
+        "number_of_pages": rng.randint(80, 1200),
+        "cover": {"medium": f"https://covers.example.org/b/isbn/{isbn}-M.jpg"},
+    }
+
+def book_summary(book: dict) -> str:
+    rng = _rng("summary", book["isbn"])
+    author = book["authors"][0] if book["authors"] else "an unknown author"
+    return (f"{book['title']} by {author} is a {book['genres'][0].lower()} novel about "
+            f"{', '.join(rng.sample(WORDS, 3))}, told across {rng.randint(2, 9)} generations.")
+
+# Books as parse_book_data returns them, plus summary and embedding
+def synthetic_books(count: int, dimensions: int, start: int = 0) -> list[dict]:
+    books = []
+    for number in range(start, start + count):
+        isbn = make_isbn(number)
+        book = parse_book_data(isbn, openlibrary_record(isbn))
+        book["summary"] = book_summary(book)
+        book["embedding"] = text_embedding(book["summary"], dimensions)
+        books.append(book)
+    return books
+
+# Questions in the shape /chat receives, some naming a catalog genre or word
+def synthetic_queries(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [rng.choice([
+        f"Can you recommend a {rng.choice(GENRES).lower()} book?",
+        f"I loved a story about a {rng.choice(WORDS)} and a {rng.choice(WORDS)}, what should I read next?",
+        f"Which books feature the {rng.choice(WORDS)}?",
+    ]) for _ in range(count)]
+
+def review_text(rng: random.Random) -> str:
+    return (f"%OverallThoughts% A {rng.choice(['gripping', 'slow', 'moving', 'uneven', 'brilliant'])} read "
+            f"about the {rng.choice(WORDS)}. %FavoriteCharacter% {rng.choice(NAMES)} "
+            f"%FavoritePart% The {rng.choice(WORDS)} scene near the end.")
+
+# Reviews from a skewed account base (a few prolific reviewers, a long tail) and distinct likes on them;
+# review_id and account_id are 1-based, matching the seeded serial columns
+def synthetic_reviews(isbns: list[str], accounts: int, reviews: int, likes: int, seed: int):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, accounts + 1)]
+    authors = rng.choices(range(1, accounts + 1), weights=weights, k=reviews)
+    rows = []
+    for review_id, account_id in enumerate(authors, start=1):
+        text = review_text(rng)
+        rows.append({"review_id": review_id, "account_id": account_id, "book_isbn": rng.choice(isbns),
+                     "rating": rng.choices((1, 2, 3, 4, 5), weights=(1, 2, 4, 6, 5))[0], "review_text": text,
+                     "sections": json.dumps(parse_review_sections(text)), "likes": 0})
+    like_rows = {}
+    likes = min(likes, len(rows) * accounts // 2)
+    while len(like_rows) < likes:
+        # Popular reviews collect most of the likes
+        review = rows[min(int(rng.paretovariate(1.0)) - 1, len(rows) - 1)] if rng.random() < 0.3 else rng.choice(rows)
+        key = (review["review_id"], rng.randint(1, accounts))
+        if key not in like_rows:
+            like_rows[key] = {"review_id": key[0], "account_id": key[1], "isbn": review["book_isbn"]}
+            review["likes"] += 1
+    return rows, list(like_rows.values())
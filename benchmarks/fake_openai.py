@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Local stand-in for the parts of the OpenAI API the app uses: /v1/embeddings and /v1/responses
+# (plain and streamed). Embeddings are deterministic per text, latency is configurable, and it can
+# answer 429 above a concurrency limit or at random, so retries and batching can be exercised offline.
+#   python -m benchmarks.fake_openai --port 8100 --latency-ms 50 --max-inflight 8
+#   OPENAI_BASE_URL=http://127.0.0.1:8100/v1 python run.py
+
+ANSWER = ("Based on the catalog, I would start with the first book listed: it matches what you asked for "
+          "and readers of similar titles rate it highly.")
+
+# Deterministic unit vector per text; the synthetic catalog stores these for its book summaries
+def text_embedding(text: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+class FakeOpenAIState:
+    def __init__(self, latency_ms=20.0, token_delay_ms=5.0, dimensions=3072, max_inflight=0, error_rate=0.0, seed=0):
+        self.latency = latency_ms / 1000
+        self.token_delay = token_delay_ms / 1000
+        self.dimensions = dimensions
+        self.max_inflight = max_inflight
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.inflight = 0
+        self.stats = {"embedding_requests": 0, "embedding_inputs": 0, "response_requests": 0,
+                      "stream_requests": 0, "rate_limited": 0}
+
+    def rejected(self):
+        if (self.max_inflight and self.inflight >= self.max_inflight) or self.random.random() < self.error_rate:
+            self.stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429, headers={"retry-after": "0.05"},
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            )
+        return None
+
+def create_app(state: FakeOpenAIState) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        rejected = state.rejected()
+        if rejected is not None:
+            return rejected
+        state.inflight += 1
+        try:
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            state.stats["embedding_requests"] += 1
+            state.stats["embedding_inputs"] += len(inputs)
+            await asyncio.sleep(state.latency)
+            dimensions = body.get("dimensions") or state.dimensions
+            data = []
+            for index, text in enumerate(inputs):
+                vector = text_embedding(text, dimensions)
+                if body.get("encoding_format") == "base64":
+                    embedding = base64.b64encode(vector.tobytes()).decode()
+                else:
+                    embedding = vector.tolist()
+                data.append({"object": "embedding", "index": index, "embedding": embedding})
+            tokens = sum(len(text) // 4 + 1 for text in inputs)
+            return {"object": "list", "data": data, "model": body["model"],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+        finally:
+            state.inflight -= 1
+
+    def response_object(model: str, text: str, status: str = "completed") -> dict:
+        return {
+            "id": "resp_fake", "object": "response", "created_at": int(time.time()), "model": model,
+            "status": status, "output": [{
+                "type": "message", "id": "msg_fake", "role": "assistant", "status": status,
+                "content": [{"type": "output_text", "text": text, "annotations": []}]
+            }],
+            "parallel_tool_calls": False, "tool_choice": "auto", "tools": []
+        }
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        body = await request.json()
+        rejected = state.rejected()
+        if rejected is not None:
+            return rejected
+        if not body.get("stream"):
+            state.inflight += 1
+            try:
+                state.stats["response_requests"] += 1
+                await asyncio.sleep(state.latency)
+                return response_object(body["model"], ANSWER)
+            finally:
+                state.inflight -= 1
+
+        state.stats["stream_requests"] += 1
+
+        async def events():
+            state.inflight += 1
+            try:
+                await asyncio.sleep(state.latency)
+                sequence = 0
+                yield f"event: response.created\ndata: {json.dumps({'type': 'response.created', 'sequence_number': sequence, 'response': response_object(body['model'], '', 'in_progress')})}\n\n"
+                for word in ANSWER.split(" "):
+                    sequence += 1
+                    delta = {"type": "response.output_text.delta", "item_id": "msg_fake", "output_index": 0,
+                             "content_index": 0, "delta": word + " ", "sequence_number": sequence, "logprobs": []}
+                    yield f"event: response.output_text.delta\ndata: {json.dumps(delta)}\n\n"
+                    await asyncio.sleep(state.token_delay)
+                completed = {"type": "response.completed", "sequence_number": sequence + 1,
+                             "response": response_object(body["model"], ANSWER)}
+                yield f"event: response.completed\ndata: {json.dumps(completed)}\n\n"
+            finally:
+                state.inflight -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return state.stats
+
+    return app
+
+# Runs an ASGI app on a background thread until server.should_exit is set
+def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+# Starts the fake server on a background thread and returns (server, state); stop with server.should_exit = True
+def serve_in_thread(port: int, **options):
+    state = FakeOpenAIState(**options)
+    return start_server(create_app(state), port), state
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--token-delay-ms", type=float, default=5.0)
+    parser.add_argument("--dimensions", type=int, default=3072)
+    parser.add_argument("--max-inflight", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    state = FakeOpenAIState(args.latency_ms, args.token_delay_ms, args.dimensions, args.max_inflight, args.error_rate)
+    uvicorn.run(create_app(state), host="127.0.0.1", port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import random
+import uvicorn
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+from benchmarks.catalog import openlibrary_record
+from benchmarks.fake_openai import start_server
+
+# Local stand-in for OpenLibrary's /api/books?jscmd=data. Every ISBN resolves to its synthetic catalog
+# record except a configurable share of unknown ones; latency and 5xx errors are configurable.
+#   python -m benchmarks.fake_openlibrary --port 8101 --latency-ms 80
+#   OPENLIBRARY_BASE_URL=http://127.0.0.1:8101 python run.py
+
+class FakeOpenLibraryState:
+    def __init__(self, latency_ms=50.0, missing_rate=0.0, error_rate=0.0, seed=0):
+        self.latency = latency_ms / 1000
+        self.missing_rate = missing_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "isbns": 0, "missing": 0, "errors": 0}
+
+    # Whether an ISBN is unknown is fixed per ISBN, so retries and cache checks see the same answer
+    def missing(self, isbn: str) -> bool:
+        return random.Random(isbn).random() < self.missing_rate
+
+def create_app(state: FakeOpenLibraryState) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/books")
+    async def books(bibkeys: str = Query(...), format: str = Query("json"), jscmd: str = Query("data")):
+        state.stats["requests"] += 1
+        await asyncio.sleep(state.latency)
+        if state.random.random() < state.error_rate:
+            state.stats["errors"] += 1
+            return JSONResponse(status_code=503, content={"error": "unavailable"})
+        result = {}
+        for key in filter(None, bibkeys.split(",")):
+            isbn = key.removeprefix("ISBN:")
+            state.stats["isbns"] += 1
+            if state.missing(isbn):
+                state.stats["missing"] += 1
+                continue
+            result[key] = openlibrary_record(isbn)
+        return result
+
+    @app.get("/stats")
+    async def stats():
+        return state.stats
+
+    return app
+
+# Starts the fake server on a background thread and returns (server, state); stop with server.should_exit = True
+def serve_in_thread(port: int, **options):
+    state = FakeOpenLibraryState(**options)
+    return start_server(create_app(state), port), state
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    state = FakeOpenLibraryState(args.latency_ms, args.missing_rate, args.error_rate)
+    uvicorn.run(create_app(state), host="127.0.0.1", port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import json
+import numpy as np
+
+# Result rows shared by the load driver and the micro-benchmarks: latency percentiles in milliseconds,
+# throughput, and an optional JSON baseline so a run can be compared against an earlier one.
+
+def summarize(name: str, latencies: list[float], seconds: float, errors: int = 0,
+              first_token: list[float] | None = None) -> dict:
+    result = {"name": name, "requests": len(latencies) + errors, "errors": errors,
+              "rps": len(latencies) / seconds if seconds > 0 else 0.0}
+    samples = np.asarray(latencies) * 1000
+    for point in (50, 95, 99):
+        result[f"p{point}_ms"] = float(np.percentile(samples, point)) if len(samples) else None
+    if first_token:
+        for point in (50, 95, 99):
+            result[f"ttft_p{point}_ms"] = float(np.percentile(np.asarray(first_token) * 1000, point))
+    return result
+
+def _format(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:,.3f}" if value < 10 else f"{value:,.1f}"
+    return f"{value:,}" if isinstance(value, int) else str(value)
+
+def print_results(results: list[dict], baseline: dict | None = None):
+    columns = [column for column in ("requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms",
+                                     "ttft_p50_ms", "ttft_p95_ms", "ttft_p99_ms")
+               if any(column in result for result in results)]
+    width = max(len(result["name"]) for result in results)
+    print(f"{'benchmark':<{width}} " + " ".join(f"{column:>12}" for column in columns))
+    for result in results:
+        print(f"{result['name']:<{width}} " + " ".join(f"{_format(result.get(column)):>12}" for column in columns))
+        before = (baseline or {}).get(result["name"])
+        if before:
+            # Relative change against the baseline run; positive latency deltas are regressions
+            deltas = []
+            for column in columns:
+                old, new = before.get(column), result.get(column)
+                deltas.append(f"{(new - old) / old:+.1%}" if isinstance(old, (int, float)) and old and new is not None
+                              else "")
+            print(f"{'  vs baseline':<{width}} " + " ".join(f"{delta:>12}" for delta in deltas))
+
+def save_results(path: str, results: list[dict]):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({result["name"]: result for result in results}, file, indent=2)
+
+def load_baseline(path: str | None) -> dict | None:
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
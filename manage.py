@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import json
+from sqlalchemy import text
+from app.helpers.db_helper import engine, build_values
+from app.helpers.schema_helper import apply_schema
+from app.helpers.reviews_helper import parse_review_sections
+from app.helpers.embedding_helper import embedding_columns, row_embedding
+from app.common.constants import EMBEDDING_STORAGE, EMBEDDING_DIMENSIONS, EMBEDDING_SNAPSHOT_DIR
+from app.helpers.index_helper import embedding_index, fetch_index_rows
+from app.helpers.neighbors_helper import rebuild_neighbors
+from app.helpers.review_stats_helper import rebuild_review_stats
+from app.helpers.review_transfer_helper import import_reviews, export_to_file
+
+# Maintenance commands: python manage.py <command>
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Stores parsed sections for reviews written before sections were saved at submit time
+async def backfill_review_sections():
+    updated = 0
+    last_id = 0
+    async with engine.connect() as conn:
+        while True:
+            rows = (await conn.execute(
+                text('''SELECT review_id, review_text FROM reviews
+                        WHERE sections IS NULL AND review_id > :last_id
+                        ORDER BY review_id LIMIT :limit'''),
+                {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE}
+            )).fetchall()
+            if not rows:
+                break
+            values, params = build_values(
+                [{"review_id": row.review_id, "sections": json.dumps(parse_review_sections(row.review_text))} for row in rows],
+                ["review_id", "sections"],
+                casts={"review_id": "BIGINT", "sections": "JSONB"}
+            )
+            await conn.execute(
+                text(f'''UPDATE reviews r SET sections = v.sections
+                         FROM (VALUES {values}) AS v(review_id, sections)
+                         WHERE r.review_id = v.review_id'''),
+                params
+            )
+            await conn.commit()
+            updated += len(rows)
+            last_id = rows[-1].review_id
+            print(f"Backfilled {updated} reviews")
+    print(f"Done: {updated} reviews backfilled")
+
+# Rewrites stored embeddings in EMBEDDING_STORAGE at EMBEDDING_DIMENSIONS, e.g. after switching to int8
+async def reencode_embeddings():
+    updated = 0
+    last_isbn = ""
+    async with engine.connect() as conn:
+        while True:
+            rows = (await conn.execute(
+                text('''SELECT isbn, embedding, embedding_blob FROM book_embeddings
+                        WHERE isbn > :last_isbn ORDER BY isbn LIMIT :limit'''),
+                {"last_isbn": last_isbn, "limit": BACKFILL_BATCH_SIZE}
+            )).fetchall()
+            if not rows:
+                break
+            values, params = build_values(
+                [{"isbn": row.isbn, **embedding_columns(row_embedding(row))} for row in rows],
+                ["isbn", "embedding", "embedding_blob"],
+                casts={"isbn": "TEXT", "embedding": "FLOAT8[]", "embedding_blob": "BYTEA"}
+            )
+            await conn.execute(
+                text(f'''UPDATE book_embeddings be SET embedding = v.embedding, embedding_blob = v.embedding_blob
+                         FROM (VALUES {values}) AS v(isbn, embedding, embedding_blob)
+                         WHERE be.isbn = v.isbn'''),
+                params
+            )
+            await conn.commit()
+            updated += len(rows)
+            last_isbn = rows[-1].isbn
+            print(f"Re-encoded {updated} embeddings")
+    print(f"Done: {updated} embeddings stored as {EMBEDDING_STORAGE} with {EMBEDDING_DIMENSIONS} dimensions")
+
+# Republishes the shared embedding snapshot from Postgres, e.g. after reencode-embeddings or a restore
+async def rebuild_embedding_snapshot():
+    if not EMBEDDING_SNAPSHOT_DIR:
+        print("EMBEDDING_SNAPSHOT_DIR is not set; nothing to rebuild")
+        return
+    async with engine.connect() as conn:
+        rows = await fetch_index_rows(conn)
+    await asyncio.to_thread(embedding_index.load, rows)
+    print(f"Published {len(embedding_index)} embeddings to {EMBEDDING_SNAPSHOT_DIR}")
+
+# Recomputes every book's neighbor list; incremental updates between runs are approximate
+async def rebuild_book_neighbors():
+    async with engine.connect() as conn:
+        books = await rebuild_neighbors(conn)
+    print(f"Done: neighbors computed for {books} books")
+
+# Recomputes the review aggregates from reviews, e.g. after bulk edits made outside the API
+async def rebuild_review_aggregates():
+    async with engine.connect() as conn:
+        books, accounts = await rebuild_review_stats(conn)
+    print(f"Done: review stats rebuilt for {books} books and {accounts} accounts")
+
+IMPORT_READ_SIZE = 1024 * 1024
+
+def file_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+# Imports reviews from an NDJSON or CSV file (by extension) the same way POST /importReviews does
+async def import_reviews_file(path: str):
+    async def chunks():
+        with open(path, "rb") as file:
+            while chunk := await asyncio.to_thread(file.read, IMPORT_READ_SIZE):
+                yield chunk
+
+    summary = await import_reviews(chunks(), file_format(path))
+    for error in summary["errors"]:
+        print(f"line {error['line']}: {error['error']}")
+    print(f"Done: {summary['imported']} reviews imported, {summary['failed']} failed")
+
+async def export_reviews_file(path: str):
+    await export_to_file("reviews", file_format(path), path)
+    print(f"Done: reviews exported to {path}")
+
+async def export_review_likes_file(path: str):
+    await export_to_file("likes", file_format(path), path)
+    print(f"Done: review likes exported to {path}")
+
+COMMANDS = {
+    "backfill-review-sections": backfill_review_sections,
+    "reencode-embeddings": reencode_embeddings,
+    "rebuild-embedding-snapshot": rebuild_embedding_snapshot,
+    "rebuild-book-neighbors": rebuild_book_neighbors,
+    "rebuild-review-stats": rebuild_review_aggregates,
+    "import-reviews": import_reviews_file,
+    "export-reviews": export_reviews_file,
+    "export-review-likes": export_review_likes_file,
+}
+# Commands that take a file path argument
+PATH_COMMANDS = {"import-reviews", "export-reviews", "export-review-likes"}
+
+async def main(command: str, path: str | None):
+    async with engine.connect() as conn:
+        await apply_schema(conn)
+    try:
+        await (COMMANDS[command](path) if command in PATH_COMMANDS else COMMANDS[command]())
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Library API maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("path", nargs="?", help=f"file for {', '.join(sorted(PATH_COMMANDS))} (.csv or .ndjson)")
+    args = parser.parse_args()
+    if (args.command in PATH_COMMANDS) != (args.path is not None):
+        parser.error(f"{args.command} {'needs' if args.command in PATH_COMMANDS else 'takes no'} path")
+    asyncio.run(main(args.command, args.path))
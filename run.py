@@ -1,6 +1,18 @@
 import uvicorn
 import os
+import secrets
+from decouple import config
 PORT = int(os.getenv("PORT"))
+WORKERS = int(os.getenv("WORKERS", "1"))
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=PORT)
\ No newline at end of file
+    if WORKERS > 1:
+        # Workers share one memory-mapped embedding snapshot instead of each loading every embedding,
+        # and response caching is off because cache invalidations would only reach one worker
+        os.environ.setdefault("EMBEDDING_SNAPSHOT_DIR", "embedding_snapshots")
+        os.environ.setdefault("RESPONSE_CACHE_BACKEND", "none")
+        # Every worker has to sign and check sessions with the same key
+        if not config("SESSION_SECRET", default=""):
+            print("SESSION_SECRET is not set; generated one for this run, so sessions end when the server restarts")
+            os.environ["SESSION_SECRET"] = secrets.token_urlsafe(32)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=PORT, workers=WORKERS)